@@ -0,0 +1,157 @@
+"""
+Response caching for QUALITY Store
+
+Read-heavy endpoints cache their pre-encoded JSON body together with an ETag.
+Each entry remembers the data version it was built from (for example the
+catalog version), so bumping that version invalidates every entry at once
+without having to track which keys depend on what. Stock levels change with
+every sale, so entries also list the products they show and are dropped only
+when one of those changes stock.
+
+Verified bearer tokens are cached too, so authenticated requests skip JWT
+decoding and signature checks for tokens that were seen recently.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches etag"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == bare
+        for candidate in candidates
+    )
+
+
+class CachedResponse:
+    __slots__ = ("version", "body", "etag", "products", "stock_version")
+
+    def __init__(self, version, body, products=frozenset(), stock_version=0):
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        # Products whose stock the body shows, as of stock_version
+        self.products = products
+        self.stock_version = stock_version
+
+
+class ResponseCache:
+    """LRU of encoded response bodies keyed by request parameters
+
+    Bounded by both entry count and the total size of the cached bodies;
+    a body larger than max_bytes on its own is returned but not kept.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version, stock_changed=None):
+        """Return the cached response for key, or None if missing or stale
+
+        stock_changed(stock_version, products), if given, reports whether
+        any of the entry's products changed stock since it was built.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version or (
+            entry.products and stock_changed is not None
+            and stock_changed(entry.stock_version, entry.products)
+        ):
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, version, body, products=frozenset(), stock_version=0):
+        """Cache an encoded body for key at version and return the entry"""
+        entry = CachedResponse(version, body, products, stock_version)
+        self._discard(key)
+        if len(body) > self.max_bytes:
+            return entry
+        self._entries[key] = entry
+        self.size += len(body)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+
+
+class TokenCache:
+    """Bounded LRU of verified bearer tokens, keyed by token digest
+
+    Each entry holds whatever the verifier derived from the token's claims
+    and expires with the token (or after max_age seconds, if that is sooner).
+    The sync verifiers run in the threadpool, so every access takes a lock.
+    """
+
+    def __init__(self, max_entries=10000, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def digest(token):
+        return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+    def get(self, token, now):
+        """Return the cached value for token, or None if missing or expired"""
+        key = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, token, value, expires_at, now):
+        """Cache the verified value for token until expires_at (a Unix time)"""
+        if self.max_age is not None:
+            expires_at = min(expires_at, now + self.max_age)
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token):
+        self.discard(self.digest(token))
+
+    def discard(self, key):
+        """Drop the entry for a token digest, if any"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,143 @@
+"""
+Shopping carts for QUALITY Store
+
+A cart is an ordered mapping from product_id to a compact line item, so
+adding, updating and removing a line are O(1) while lines keep the order in
+which they were first added.
+
+Each cart also keeps a running subtotal (in integer cents), line count and
+unit count, adjusted on every mutation, so the cart summary is O(1) to read.
+Line prices are snapshots of catalog prices taken at a given catalog
+price_version; when the catalog's price_version moves, ensure_priced()
+re-prices every line once.
+"""
+
+from datetime import datetime
+
+
+def to_cents(price):
+    return round(price * 100)
+
+
+class LineItem:
+    """One product line in a cart"""
+
+    __slots__ = ("product_id", "quantity", "added_at", "unit_price")
+
+    def __init__(self, product_id, quantity, added_at=None, unit_price=None):
+        self.product_id = product_id
+        self.quantity = quantity
+        self.added_at = added_at or datetime.now().isoformat()
+        # Price in cents, or None when the product is no longer in the catalog
+        self.unit_price = unit_price
+
+    @property
+    def total(self):
+        return self.quantity * self.unit_price if self.unit_price is not None else 0
+
+    def to_document(self):
+        return {
+            "product_id": self.product_id,
+            "quantity": self.quantity,
+            "added_at": self.added_at,
+            "unit_price": self.unit_price,
+        }
+
+
+class Cart:
+    """Line items keyed by product_id, in insertion order, with running totals"""
+
+    __slots__ = ("_lines", "subtotal", "quantity", "items_count", "priced_version")
+
+    def __init__(self, lines=()):
+        self._lines = {}
+        self.subtotal = 0  # cents, over lines whose product is available
+        self.quantity = 0  # units, over lines whose product is available
+        self.items_count = 0  # lines whose product is available
+        self.priced_version = None
+        for line in lines:
+            self._lines[line.product_id] = line
+            self._count(line, 1)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines.values())
+
+    def __contains__(self, product_id):
+        return product_id in self._lines
+
+    @property
+    def total(self):
+        """Subtotal in currency units"""
+        return self.subtotal / 100
+
+    def _count(self, line, sign):
+        if line.unit_price is None:
+            return
+        self.subtotal += sign * line.total
+        self.quantity += sign * line.quantity
+        self.items_count += sign
+
+    def get(self, product_id):
+        """Return the line for product_id, or None"""
+        return self._lines.get(product_id)
+
+    def add(self, product_id, quantity, unit_price):
+        """Add quantity of a product at unit_price (cents), creating its line if needed"""
+        line = self._lines.get(product_id)
+        if line is None:
+            line = self._lines[product_id] = LineItem(product_id, 0)
+        else:
+            self._count(line, -1)
+        line.quantity += quantity
+        line.unit_price = unit_price
+        self._count(line, 1)
+        return line
+
+    def set_quantity(self, product_id, quantity, unit_price):
+        """Set the quantity of an existing line; raises KeyError if it is missing"""
+        line = self._lines[product_id]
+        self._count(line, -1)
+        line.quantity = quantity
+        line.unit_price = unit_price
+        self._count(line, 1)
+        return line
+
+    def remove(self, product_id):
+        """Remove a line and return it, or None if it was not in the cart"""
+        line = self._lines.pop(product_id, None)
+        if line is not None:
+            self._count(line, -1)
+        return line
+
+    def ensure_priced(self, price_of, version):
+        """Re-price every line if prices may have changed since the last pricing
+
+        price_of(product_id) returns the current price in cents, or None if
+        the product no longer exists.
+        """
+        if self.priced_version == version:
+            return
+        self.subtotal = self.quantity = self.items_count = 0
+        for line in self._lines.values():
+            line.unit_price = price_of(line.product_id)
+            self._count(line, 1)
+        self.priced_version = version
+
+    def summary(self):
+        return {"total": round(self.total, 2), "items_count": self.items_count, "quantity": self.quantity}
+
+    def to_document(self):
+        """Serialize to the stored list-of-lines form"""
+        return [line.to_document() for line in self._lines.values()]
+
+    @classmethod
+    def from_document(cls, document):
+        # priced_version is left unset: versions are local to each worker, so
+        # a cart loaded from shared storage is always re-priced before use
+        return cls(
+            LineItem(d["product_id"], d["quantity"], d.get("added_at"), d.get("unit_price"))
+            for d in document
+        )
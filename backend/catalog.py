@@ -0,0 +1,428 @@
+"""
+Product catalog for QUALITY Store
+
+Keeps every product in a primary hash index keyed by id, plus secondary
+indexes by category and by uploading owner, so lookups stay O(1) no matter
+how large the catalog grows. Product names and descriptions are also kept
+in an inverted token index with a prefix table for typeahead search.
+Unranked listings page through sequence indexes (one for the catalog, one
+per category), so fetching a page does not touch the rest of the catalog.
+"""
+
+import base64
+import bisect
+import itertools
+import re
+import unicodedata
+from collections import OrderedDict
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Kana and CJK ideographs: written without spaces, so runs are split into bigrams
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+# Longest prefix stored in the prefix table; longer query terms are
+# narrowed from their first MAX_PREFIX_LENGTH characters
+MAX_PREFIX_LENGTH = 10
+
+# Score weights for where a term matched
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+PREFIX_MATCH_FACTOR = 0.5
+
+
+def encode_cursor(sort_key):
+    """Encode a listing sort key as an opaque cursor string"""
+    score, sequence = sort_key
+    raw = f"{score!r}:{sequence}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        score, sequence = raw.split(":")
+        return (float(score), int(sequence))
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def paginate(entries, limit=None, cursor=None):
+    """Slice (sort_key, product) entries after a cursor
+
+    Returns the page of products and the cursor for the next page, which is
+    None once the listing is exhausted.
+    """
+    start = 0
+    if cursor:
+        start = bisect.bisect_right(entries, decode_cursor(cursor), key=lambda entry: entry[0])
+    end = len(entries) if limit is None else start + limit
+    page = entries[start:end]
+    next_cursor = encode_cursor(page[-1][0]) if page and end < len(entries) else None
+    return [product for _, product in page], next_cursor
+
+
+def tokenize(text):
+    """Split text into casefolded alphanumeric tokens in any script
+
+    CJK runs have no word boundaries, so they become overlapping bigrams
+    (a lone CJK character is a token of its own).
+    """
+    if not text:
+        return []
+    tokens = []
+    for word in TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).casefold()):
+        if word.isascii():
+            tokens.append(word)
+            continue
+        position = 0
+        for run in CJK_PATTERN.finditer(word):
+            if run.start() > position:
+                tokens.append(word[position:run.start()])
+            chars = run.group()
+            tokens.extend(chars[i:i + 2] for i in range(max(len(chars) - 1, 1)))
+            position = run.end()
+        if position < len(word):
+            tokens.append(word[position:])
+    return tokens
+
+
+class SearchIndex:
+    """Inverted token index with a prefix table over product name and description"""
+
+    def __init__(self):
+        self._postings = {}
+        self._prefixes = {}
+        self._tokens_by_product = {}
+
+    def add(self, product):
+        """Index a product's name and description"""
+        product_id = product["id"]
+        self.remove(product_id)
+
+        weights = {}
+        for token in tokenize(product.get("name")):
+            weights[token] = weights.get(token, 0) | NAME_WEIGHT
+        for token in tokenize(product.get("description")):
+            weights[token] = weights.get(token, 0) | DESCRIPTION_WEIGHT
+
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                    self._prefixes.setdefault(token[:length], set()).add(token)
+            postings[product_id] = weight
+        self._tokens_by_product[product_id] = tuple(weights)
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        for token in self._tokens_by_product.pop(product_id, ()):
+            postings = self._postings[token]
+            del postings[product_id]
+            if postings:
+                continue
+            del self._postings[token]
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                prefix = token[:length]
+                tokens = self._prefixes[prefix]
+                tokens.discard(token)
+                if not tokens:
+                    del self._prefixes[prefix]
+
+    def _expand(self, term):
+        """Return index tokens that start with term"""
+        tokens = self._prefixes.get(term[:MAX_PREFIX_LENGTH], ())
+        if len(term) > MAX_PREFIX_LENGTH:
+            return [token for token in tokens if token.startswith(term)]
+        return tokens
+
+    def search(self, query):
+        """Return {product_id: score} for products matching every query term
+
+        Each term matches whole tokens exactly or as a prefix; name hits score
+        above description hits and exact hits score above prefix hits.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return {}
+
+        scores = None
+        for term in dict.fromkeys(terms):
+            term_scores = {}
+            for token in self._expand(term):
+                factor = 1.0 if token == term else PREFIX_MATCH_FACTOR
+                for product_id, weight in self._postings[token].items():
+                    score = weight * factor
+                    if score > term_scores.get(product_id, 0):
+                        term_scores[product_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    product_id: score + term_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in term_scores
+                }
+            if not scores:
+                break
+        return scores
+
+
+class SequenceIndex:
+    """Product ids in insertion-sequence order, for seeking to a listing cursor
+
+    Removals leave a gap that iteration skips; the list is compacted once
+    gaps make up half of it, so seeking stays O(log n) and a page of k ids
+    costs O(k) amortised.
+    """
+
+    def __init__(self):
+        self._sequences = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, sequence, product_id):
+        if sequence in self._ids:
+            return
+        self._ids[sequence] = product_id
+        if not self._sequences or sequence > self._sequences[-1]:
+            self._sequences.append(sequence)
+            return
+        position = bisect.bisect_left(self._sequences, sequence)
+        if position == len(self._sequences) or self._sequences[position] != sequence:
+            self._sequences.insert(position, sequence)
+
+    def discard(self, sequence):
+        if self._ids.pop(sequence, None) is not None and len(self._sequences) > 2 * len(self._ids) + 64:
+            self._sequences = [seq for seq in self._sequences if seq in self._ids]
+
+    def after(self, sequence=None):
+        """Yield (sequence, product id) in order, starting after sequence"""
+        sequences = self._sequences
+        position = 0 if sequence is None else bisect.bisect_right(sequences, sequence)
+        while position < len(sequences):
+            product_id = self._ids.get(sequences[position])
+            if product_id is not None:
+                yield sequences[position], product_id
+            position += 1
+
+
+class ProductCatalog:
+    """In-memory product store with id, category and owner indexes"""
+
+    def __init__(self, products=()):
+        self._by_id = {}
+        self._by_category = {}
+        self._by_owner = {}
+        self._sequence = {}
+        self._next_sequence = itertools.count()
+        # Sequence order of the whole catalog and of each category, for paging
+        self._order = SequenceIndex()
+        self._category_order = {}
+        self._search_index = SearchIndex()
+        # Bumped on every change except stock updates, so derived data (e.g.
+        # cached responses) can detect staleness; stock moves with every sale
+        # and has its own stock_version and per-product log instead
+        self.version = 0
+        self.stock_version = 0
+        self._stock_changes = OrderedDict()
+        # Bumped only when a product's price changes or a product is removed,
+        # which is all that priced snapshots such as cart totals depend on
+        self.price_version = 0
+        # Called with the product id after every add or remove, if set
+        self.on_change = None
+        for product in products:
+            self.add(product)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __contains__(self, product_id):
+        return product_id in self._by_id
+
+    def get(self, product_id):
+        """Return the product with this id, or None"""
+        return self._by_id.get(product_id)
+
+    def all(self):
+        """Return all products in insertion order"""
+        return list(self._by_id.values())
+
+    def by_category(self, category):
+        """Return products in a category in insertion order"""
+        return list(self._by_category.get(category, {}).values())
+
+    def by_owner(self, phone_number):
+        """Return products uploaded by an owner in insertion order"""
+        return list(self._by_owner.get(phone_number, {}).values())
+
+    def owner_uploaded(self):
+        """Return every owner-uploaded product"""
+        return [product for bucket in self._by_owner.values() for product in bucket.values()]
+
+    def add(self, product):
+        """Add or replace a product and update all indexes"""
+        product_id = product["id"]
+        if product_id in self._by_id:
+            previous = self._by_id[product_id]
+            if previous.get("price") != product.get("price"):
+                self.price_version += 1
+            # Buckets the product stays in keep its position when replaced
+            self._unindex(previous, keep=self._buckets(product))
+            if previous["category"] != product["category"]:
+                self._discard_order(previous["category"], self._sequence[product_id])
+        else:
+            self._sequence[product_id] = next(self._next_sequence)
+            self._order.add(self._sequence[product_id], product_id)
+        self._category_order.setdefault(product["category"], SequenceIndex()).add(self._sequence[product_id], product_id)
+        self._by_id[product_id] = product
+        self._search_index.add(product)
+        self.version += 1
+        self._notify(product_id)
+        for index, key in self._buckets(product):
+            self._insert(index, key, product)
+        return product
+
+    def remove(self, product_id):
+        """Remove a product from all indexes and return it, or None"""
+        product = self._by_id.pop(product_id, None)
+        if product is not None:
+            self._unindex(product)
+            self._search_index.remove(product_id)
+            self._stock_changes.pop(product_id, None)
+            sequence = self._sequence.pop(product_id)
+            self._order.discard(sequence)
+            self._discard_order(product["category"], sequence)
+            self.version += 1
+            self.price_version += 1
+            self._notify(product_id)
+        return product
+
+    def set_stock(self, product_id, stock):
+        """Update a product's stock level, returning the product or None if absent
+
+        Only stock_version moves, so cached data that does not show this
+        product's stock stays valid (see stock_changed_since).
+        """
+        product = self._by_id.get(product_id)
+        if product is None or product.get("stock") == stock:
+            return product
+        product = {**product, "stock": stock}
+        self._by_id[product_id] = product
+        for index, key in self._buckets(product):
+            index[key][product_id] = product
+        self.stock_version += 1
+        self._stock_changes[product_id] = self.stock_version
+        self._stock_changes.move_to_end(product_id)
+        self._notify(product_id)
+        return product
+
+    def stock_changed_since(self, stock_version, product_ids):
+        """True if the stock of any of product_ids changed after stock_version"""
+        for product_id, changed_at in reversed(self._stock_changes.items()):
+            if changed_at <= stock_version:
+                return False
+            if product_id in product_ids:
+                return True
+        return False
+
+    def _notify(self, product_id):
+        if self.on_change is not None:
+            self.on_change(product_id)
+
+    def search(self, query, category=None):
+        """Return products matching a search query, best matches first
+
+        Ties keep catalog insertion order. When category is given only
+        products in that category are returned.
+        """
+        return [product for _, product in self.listing(query, category)]
+
+    def listing(self, query=None, category=None):
+        """Return (sort_key, product) pairs for a product listing
+
+        Sort keys are (-score, insertion sequence), unique and stable across
+        requests, so they can be used as pagination cursors. Listings without
+        a query have a score of 0 and keep catalog insertion order.
+        """
+        if not query:
+            products = self._by_category.get(category, {}) if category else self._by_id
+            return [((0.0, self._sequence[pid]), product) for pid, product in products.items()]
+
+        scores = self._search_index.search(query)
+        if category is not None:
+            bucket = self._by_category.get(category, {})
+            scores = {pid: score for pid, score in scores.items() if pid in bucket}
+        entries = [((-score, self._sequence[pid]), self._by_id[pid]) for pid, score in scores.items()]
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+
+    def page(self, query=None, category=None, limit=None, cursor=None):
+        """Return (products, next_cursor) for one page of a listing
+
+        Listings without a query seek to the cursor in the sequence index,
+        so a page costs O(limit) however large the catalog is; only ranked
+        search results are built in full. Raises ValueError for a bad cursor.
+        """
+        if query:
+            return paginate(self.listing(query, category), limit, cursor)
+
+        after = decode_cursor(cursor)[1] if cursor else None
+        order = self._category_order.get(category) if category else self._order
+        if order is None:
+            return [], None
+        entries = order.after(after)
+        if limit is not None:
+            entries = list(itertools.islice(entries, limit + 1))
+        products = [self._by_id[product_id] for _, product_id in entries]
+        if limit is None or len(products) <= limit:
+            return products, None
+        return products[:limit], encode_cursor((0.0, entries[limit - 1][0]))
+
+    def _discard_order(self, category, sequence):
+        order = self._category_order.get(category)
+        if order is not None:
+            order.discard(sequence)
+            if not order:
+                del self._category_order[category]
+
+    def _buckets(self, product):
+        """Return (index, key) for each secondary index bucket holding product"""
+        buckets = [(self._by_category, product["category"])]
+        if product.get("owner_uploaded"):
+            buckets.append((self._by_owner, product.get("uploaded_by")))
+        return buckets
+
+    def _insert(self, index, key, product):
+        """Put product in index[key], keeping the bucket in sequence order
+
+        Buckets list products in insertion order, so a product moved into a
+        bucket after newer products (e.g. a category change) re-sorts it.
+        """
+        product_id = product["id"]
+        bucket = index.setdefault(key, {})
+        if product_id in bucket:
+            bucket[product_id] = product
+            return
+        last_id = next(reversed(bucket), None)
+        bucket[product_id] = product
+        if last_id is not None and self._sequence[last_id] > self._sequence[product_id]:
+            index[key] = dict(sorted(bucket.items(), key=lambda item: self._sequence[item[0]]))
+
+    def _unindex(self, product, keep=()):
+        product_id = product["id"]
+        for index, key in self._buckets(product):
+            if any(index is kept_index and key == kept_key for kept_index, kept_key in keep):
+                continue
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(product_id, None)
+                if not bucket:
+                    del index[key]
@@ -0,0 +1,88 @@
+"""
+Catalog export feed for QUALITY Store
+
+Encodes products as NDJSON or CSV for partners, one record at a time, and
+groups the output into chunks of about CHUNK_SIZE bytes, optionally gzip
+compressed, so a response body can be streamed without ever holding the
+encoded catalog in memory.
+
+Incremental exports also carry removed products, as records with only an
+id and deleted set to true.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+# Fields exported to partners; owner details stay internal
+EXPORT_FIELDS = ("id", "name", "category", "price", "description", "image_url", "stock")
+
+# Target size of each chunk handed to the server
+CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _ndjson_record(product_id, product):
+    if product is None:
+        record = {"id": product_id, "deleted": True}
+    else:
+        record = {field: product.get(field) for field in EXPORT_FIELDS}
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+class _CSVEncoder:
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def _row(self, values):
+        self._writer.writerow(values)
+        line = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return line
+
+    def header(self):
+        return self._row(EXPORT_FIELDS + ("deleted",))
+
+    def record(self, product_id, product):
+        if product is None:
+            return self._row([product_id] + [""] * (len(EXPORT_FIELDS) - 1) + ["true"])
+        return self._row([product.get(field, "") for field in EXPORT_FIELDS] + ["false"])
+
+
+def encode_records(changes, format):
+    """Yield encoded text for (product_id, product or None) pairs"""
+    if format == "csv":
+        encoder = _CSVEncoder()
+        yield encoder.header()
+        for product_id, product in changes:
+            yield encoder.record(product_id, product)
+    else:
+        for product_id, product in changes:
+            yield _ndjson_record(product_id, product)
+
+
+def chunked(pieces, compress=False, chunk_size=CHUNK_SIZE):
+    """Group text pieces into encoded byte chunks of about chunk_size
+
+    With compress, the chunks together form one gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    parts, size = [], 0
+    for piece in pieces:
+        parts.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            data = "".join(parts).encode()
+            parts, size = [], 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = "".join(parts).encode()
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
@@ -0,0 +1,127 @@
+"""
+Bulk catalog import for QUALITY Store
+
+Owners can upload a product list as NDJSON (one JSON object per line) or CSV
+(with a header row). The request body is parsed incrementally as it streams
+in, so memory use depends on the longest record rather than the file size.
+Each record is validated on its own; records that fail are reported back by
+line number while the rest are imported.
+"""
+
+import codecs
+import csv
+import json
+import math
+
+# Longest record accepted, to bound buffering when a body has no newlines
+MAX_RECORD_LENGTH = 64 * 1024
+
+
+class ImportFormatError(ValueError):
+    """The body cannot be parsed any further (e.g. an oversized record)"""
+
+
+async def iter_lines(chunks):
+    """Yield (line_number, line) from an async iterator of byte chunks
+
+    A leading UTF-8 byte order mark (as written by spreadsheet exports) is dropped.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.rstrip("\r")
+        if len(buffer) > MAX_RECORD_LENGTH:
+            raise ImportFormatError(f"Line {line_number + 1} is longer than {MAX_RECORD_LENGTH} characters")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_number + 1, buffer.rstrip("\r")
+
+
+async def iter_ndjson(chunks):
+    """Yield (line_number, record, error) for each non-blank NDJSON line"""
+    async for line_number, line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+async def iter_csv(chunks):
+    """Yield (line_number, record, error) for each CSV row after the header
+
+    A quoted field may span lines; the row is reported at its first line.
+    """
+    header = None
+    pending, start = "", None
+    async for line_number, line in iter_lines(chunks):
+        pending = f"{pending}\n{line}" if start is not None else line
+        start = start if start is not None else line_number
+        if pending.count('"') % 2:
+            # Inside a quoted field: keep reading until the quote closes
+            if len(pending) > MAX_RECORD_LENGTH:
+                raise ImportFormatError(f"Row at line {start} is longer than {MAX_RECORD_LENGTH} characters")
+            continue
+        row_start, row_text = start, pending
+        pending, start = "", None
+        if not row_text.strip():
+            continue
+        row = next(csv.reader([row_text]))
+        if header is None:
+            header = [column.strip().lower() for column in row]
+            continue
+        if len(row) != len(header):
+            yield row_start, None, f"Expected {len(header)} columns, got {len(row)}"
+            continue
+        yield row_start, dict(zip(header, row)), None
+    if start is not None:
+        yield start, None, "Unterminated quoted field"
+
+
+def validate_product_row(record):
+    """Return the product fields of an import record, or raise ValueError"""
+    name = str(record.get("name") or "").strip()
+    category = str(record.get("category") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    if not category:
+        raise ValueError("category is required")
+
+    try:
+        price = float(record.get("price"))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("price must be a number") from None
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("price must be a non-negative number")
+
+    stock = record.get("stock")
+    try:
+        stock = int(stock) if stock not in (None, "") else 0
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("stock must be a whole number") from None
+    if stock < 0:
+        raise ValueError("stock must not be negative")
+
+    image_url = str(record.get("image_url") or "").strip()
+    if image_url and not image_url.startswith(("https://", "http://", "/api/images/")):
+        raise ValueError("image_url must be an http(s) URL or a stored image URL")
+
+    return {
+        "name": name,
+        "category": category,
+        "price": price,
+        "description": str(record.get("description") or "").strip(),
+        "stock": stock,
+        "image_url": image_url,
+    }
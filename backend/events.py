@@ -0,0 +1,99 @@
+"""
+Product change notifications for QUALITY Store
+
+An in-process publish/subscribe hub: each open push connection subscribes
+to the products in its cart, and anything that changes a product's price,
+stock or availability publishes the product id. Subscribers are kept in a
+set per product, so publishing only touches the connections that care.
+
+Notifications are coalesced: a subscription only remembers which products
+changed, and after the first change it waits a short delay to collect the
+rest of a burst, so a run of updates to one product is delivered once with
+its latest state.
+"""
+
+import asyncio
+
+
+class ProductSubscription:
+    """One connection's interest in a set of products"""
+
+    __slots__ = ("owner", "products", "_pending", "_ready")
+
+    def __init__(self, owner, product_ids):
+        self.owner = owner
+        self.products = set(product_ids)
+        self._pending = set()
+        self._ready = asyncio.Event()
+
+    def _notify(self, product_id):
+        self._pending.add(product_id)
+        self._ready.set()
+
+    async def changes(self, timeout, coalesce_delay=0.0):
+        """Wait up to timeout for changes; return the changed product ids (maybe empty)"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return set()
+        if coalesce_delay:
+            await asyncio.sleep(coalesce_delay)
+        changed, self._pending = self._pending, set()
+        self._ready.clear()
+        return changed
+
+
+class ProductEvents:
+    """Per-product subscriber sets for product change notifications"""
+
+    def __init__(self):
+        self._by_product = {}
+        self._by_owner = {}
+
+    def __len__(self):
+        """Number of open subscriptions"""
+        return sum(len(subscriptions) for subscriptions in self._by_owner.values())
+
+    def subscribe(self, owner, product_ids):
+        subscription = ProductSubscription(owner, product_ids)
+        self._by_owner.setdefault(owner, set()).add(subscription)
+        for product_id in subscription.products:
+            self._by_product.setdefault(product_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._set_products(subscription, ())
+        subscriptions = self._by_owner.get(subscription.owner)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._by_owner[subscription.owner]
+
+    def follow(self, owner, product_ids):
+        """Point every subscription of owner at a new set of products
+
+        Newly followed products are reported as changed, so the subscriber
+        receives their current state.
+        """
+        product_ids = set(product_ids)
+        for subscription in self._by_owner.get(owner, ()):
+            added = product_ids - subscription.products
+            self._set_products(subscription, product_ids)
+            for product_id in added:
+                subscription._notify(product_id)
+
+    def publish(self, product_id):
+        """Report that a product's price, stock or availability changed"""
+        for subscription in self._by_product.get(product_id, ()):
+            subscription._notify(product_id)
+
+    def _set_products(self, subscription, product_ids):
+        product_ids = set(product_ids)
+        for product_id in subscription.products - product_ids:
+            subscribers = self._by_product[product_id]
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._by_product[product_id]
+        for product_id in product_ids - subscription.products:
+            self._by_product.setdefault(product_id, set()).add(subscription)
+        subscription.products = product_ids
@@ -0,0 +1,345 @@
+"""
+Image storage for QUALITY Store
+
+Owner-uploaded product images are decoded once and stored on disk in a
+content-addressed blob store: each blob is named by the SHA-256 of its bytes,
+so identical uploads are stored once and a blob never changes after it is
+written. Product records only carry the short URL of the blob.
+
+Each blob's content type is sniffed once, when it is stored, and kept in a
+small sidecar file; size and content type are then cached per process, since
+blobs never change.
+
+Blobs are served by BlobResponse, which supports single byte-range requests.
+The file is opened and read in chunks of SEND_CHUNK_SIZE on a worker thread,
+so memory use per response stays bounded and the event loop never blocks on
+disk. Servers implementing the ASGI zero-copy send extension get the file
+descriptor instead (uvicorn does not).
+
+When Pillow is installed, each upload is also resized into a few smaller,
+recompressed variants by a background worker pool, so storefront tiles can
+fetch an image close to the size they display.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import anyio
+from starlette.responses import Response
+
+try:
+    from PIL import Image, features
+except ImportError:  # Thumbnails are optional; originals are served instead
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Magic-number prefixes of the image formats owners upload
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+# Bytes read and sent per ASGI message when zero-copy send is unavailable
+SEND_CHUNK_SIZE = 256 * 1024
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+# Widths of the resized variants generated for each upload
+VARIANT_WIDTHS = (150, 300, 600)
+VARIANT_QUALITY = 80
+
+
+def decode_image_data(image_data: str) -> bytes:
+    """Decode a base64 data URL (or bare base64 string) to raw bytes
+
+    Raises ValueError if the payload is not valid base64 or is empty.
+    """
+    if image_data.startswith("data:"):
+        header, _, image_data = image_data.partition(",")
+        if not header.endswith(";base64"):
+            raise ValueError("Image data URL must be base64 encoded")
+    try:
+        data = base64.b64decode(image_data, validate=True)
+    except binascii.Error as exc:
+        raise ValueError("Invalid base64 image data") from exc
+    if not data:
+        raise ValueError("Image data is empty")
+    return data
+
+
+def sniff_content_type(header: bytes) -> str:
+    """Guess an image MIME type from the first bytes of a file"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    """Content-addressed blob store on the local filesystem"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # digest -> (size, content type); blobs are immutable, so never stale
+        self._info = {}
+
+    def path(self, digest: str) -> Path:
+        """Return the on-disk path for a digest (the blob may not exist)"""
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError("Invalid blob digest")
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        try:
+            return self.path(digest).is_file()
+        except ValueError:
+            return False
+
+    def put(self, data: bytes) -> str:
+        """Store bytes and return their digest, skipping the write if already stored"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if path.is_file():
+            return digest
+
+        path.parent.mkdir(exist_ok=True)
+        # The content type goes first, so a visible blob always has one
+        self._write(self._content_type_path(path), sniff_content_type(data[:16]).encode())
+        self._write(path, data)
+        return digest
+
+    def info(self, digest: str):
+        """Return (size, content type) of a stored blob, or None if it is missing
+
+        Does file I/O on a cache miss, so call it from a worker thread.
+        """
+        info = self._info.get(digest)
+        if info is None:
+            try:
+                path = self.path(digest)
+                size = path.stat().st_size
+            except (ValueError, OSError):
+                return None
+            try:
+                content_type = self._content_type_path(path).read_text()
+            except OSError:
+                # Stored before content types were recorded
+                with open(path, "rb") as blob:
+                    content_type = sniff_content_type(blob.read(16))
+            info = self._info[digest] = (size, content_type)
+        return info
+
+    @staticmethod
+    def _content_type_path(path):
+        return path.with_name(path.name + ".type")
+
+    @staticmethod
+    def _write(path, data):
+        # Write to a temp file and rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class ThumbnailPipeline:
+    """Generate resized variants of stored images in a background thread pool
+
+    Variants are stored as ordinary blobs. The widths available for an
+    original are recorded in a small JSON manifest next to it, so they survive
+    restarts and are visible to every worker process sharing the store.
+    """
+
+    def __init__(self, blob_store, widths=VARIANT_WIDTHS, max_workers=2):
+        self.blob_store = blob_store
+        self.widths = tuple(sorted(widths))
+        self.enabled = Image is not None
+        self._variants = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails") if self.enabled else None
+
+    def submit(self, digest):
+        """Schedule variant generation for a stored image; returns a future or None"""
+        if not self.enabled:
+            return None
+        return self._executor.submit(self._generate, digest)
+
+    def variant(self, digest, width):
+        """Return the digest of the smallest ready variant at least width wide
+
+        Falls back to the original when no suitable variant exists (yet).
+        """
+        variants = self._load_manifest(digest)
+        for variant_width in sorted(variants, key=int):
+            if int(variant_width) >= width:
+                return variants[variant_width]
+        return digest
+
+    def is_final(self, digest):
+        """True once variant generation for digest has finished"""
+        return digest in self._variants or not self.enabled
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _manifest_path(self, digest):
+        path = self.blob_store.path(digest)
+        return path.with_name(path.name + ".variants.json")
+
+    def _load_manifest(self, digest):
+        variants = self._variants.get(digest)
+        if variants is None:
+            try:
+                with open(self._manifest_path(digest)) as manifest:
+                    variants = self._variants[digest] = json.load(manifest)
+            except (OSError, ValueError):
+                return {}
+        return variants
+
+    def _generate(self, digest):
+        if self._load_manifest(digest):
+            return self._variants[digest]
+
+        variants = {}
+        try:
+            with Image.open(self.blob_store.path(digest)) as original:
+                original.load()
+                for width in self.widths:
+                    if width >= original.width:
+                        break
+                    variants[str(width)] = self.blob_store.put(self._resize(original, width))
+        except Exception as exc:
+            # Undecodable or unsupported uploads are still served as originals
+            logger.warning("Could not generate thumbnails for image %s: %s", digest, exc)
+
+        # Write the manifest even when empty so the work is not retried
+        manifest_path = self._manifest_path(digest)
+        tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+        with open(tmp_path, "w") as manifest:
+            json.dump(variants, manifest)
+        os.replace(tmp_path, manifest_path)
+        self._variants[digest] = variants
+        return variants
+
+    @staticmethod
+    def _resize(image, width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if features.check("webp"):
+            if resized.mode not in ("RGB", "RGBA"):
+                resized = resized.convert("RGBA")
+            resized.save(buffer, format="WEBP", quality=VARIANT_QUALITY)
+        else:
+            resized.convert("RGB").save(buffer, format="JPEG", quality=VARIANT_QUALITY, optimize=True)
+        return buffer.getvalue()
+
+
+def parse_range(range_header, size):
+    """Parse a single-range Range header against a file size
+
+    Returns (start, end) with end exclusive, None when the header should be
+    ignored (absent, malformed or multi-range), or raises ValueError when the
+    range cannot be satisfied.
+    """
+    if not range_header:
+        return None
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if start >= size or start >= end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+class BlobResponse(Response):
+    """Serve a file, or one byte range of it, in chunks or via zero-copy send
+
+    Pass the file size when it is already known; otherwise the constructor
+    stats the file, which blocks.
+    """
+
+    def __init__(self, path, media_type, headers=None, range_header=None, method="GET", size=None):
+        self.path = path
+        self.media_type = media_type
+        self.background = None
+        self.send_header_only = method.upper() == "HEAD"
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+
+        if size is None:
+            size = os.stat(path).st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            self.status_code = 416
+            self.start = self.end = 0
+            self.headers["content-range"] = f"bytes */{size}"
+        else:
+            if byte_range is None:
+                self.status_code = 200
+                self.start, self.end = 0, size
+            else:
+                self.status_code = 206
+                self.start, self.end = byte_range
+                self.headers["content-range"] = f"bytes {self.start}-{self.end - 1}/{size}"
+        self.headers["content-length"] = str(self.end - self.start)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start
+        if self.send_header_only or count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        async with await anyio.open_file(self.path, "rb") as blob:
+            if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+                await send({
+                    "type": ZERO_COPY_EXTENSION,
+                    "file": blob.wrapped.fileno(),
+                    "offset": self.start,
+                    "count": count,
+                })
+                return
+
+            await blob.seek(self.start)
+            for offset in range(self.start, self.end, SEND_CHUNK_SIZE):
+                chunk_end = min(offset + SEND_CHUNK_SIZE, self.end)
+                await send({
+                    "type": "http.response.body",
+                    "body": await blob.read(chunk_end - offset),
+                    "more_body": chunk_end < self.end,
+                })
@@ -0,0 +1,134 @@
+"""
+Stock ledger for QUALITY Store
+
+Tracks, per SKU, the units on hand and the units reserved by each holder
+(a customer's cart). Reservations expire after a TTL so abandoned carts give
+their stock back. Committing a reservation (at checkout) removes the units
+from on-hand stock.
+
+Every operation is a synchronous read-modify-write inside
+storage.transaction(), so it is atomic with respect to other asyncio tasks
+(there is no await inside) and, with a SQL storage backend, with respect to
+other worker processes.
+"""
+
+import time
+
+
+class InsufficientStock(Exception):
+    """Raised when a reservation or commit asks for more units than are available"""
+
+    def __init__(self, product_id, available):
+        super().__init__(f"Only {available} items available for product {product_id}")
+        self.product_id = product_id
+        self.available = available
+
+
+class StockLedger:
+    """Per-SKU on-hand counts and expiring reservations kept in a repository"""
+
+    def __init__(self, storage, ttl=1800):
+        self.ttl = ttl
+        self._storage = storage
+        self._entries = storage.repository("stock_ledger")
+        # Called with the product id after every change, if set
+        self.on_change = None
+
+    def _load(self, product_id, initial_stock, now):
+        """Return the SKU entry with expired reservations dropped"""
+        entry = self._entries.get(product_id)
+        if entry is None:
+            return {"on_hand": initial_stock, "reservations": {}}
+        reservations = entry["reservations"]
+        expired = [holder for holder, r in reservations.items() if r["expires_at"] <= now]
+        for holder in expired:
+            del reservations[holder]
+        return entry
+
+    @staticmethod
+    def _available(entry, holder):
+        reserved = sum(r["quantity"] for h, r in entry["reservations"].items() if h != holder)
+        return entry["on_hand"] - reserved
+
+    def on_hand(self, product_id, initial_stock):
+        entry = self._entries.get(product_id)
+        return entry["on_hand"] if entry else initial_stock
+
+    def on_hand_levels(self):
+        """Return {product_id: on_hand} for every SKU the ledger tracks"""
+        return {product_id: entry["on_hand"] for product_id, entry in self._entries.items()}
+
+    def available(self, product_id, initial_stock, holder=None):
+        """Units holder could reserve: on hand minus other holders' live reservations
+
+        initial_stock seeds the on-hand count for SKUs the ledger has not seen.
+        """
+        return self._available(self._load(product_id, initial_stock, time.time()), holder)
+
+    def lock(self, product_ids):
+        """Lock the ledger entries for product_ids until the transaction ends
+
+        Call this first in a transaction that touches several SKUs, so that
+        concurrent transactions always take the row locks in the same order.
+        """
+        self._entries.lock(product_ids)
+
+    def reserved(self, product_id, holder):
+        """Units currently reserved by holder (0 if none or expired)"""
+        entry = self._entries.get(product_id)
+        reservation = entry and entry["reservations"].get(holder)
+        if not reservation or reservation["expires_at"] <= time.time():
+            return 0
+        return reservation["quantity"]
+
+    def reserve(self, product_id, holder, quantity, initial_stock):
+        """Set holder's reservation for a SKU to quantity and restart its TTL
+
+        A quantity of 0 releases the reservation. Raises InsufficientStock
+        without changing anything if the units are not available.
+        """
+        if quantity < 0:
+            raise ValueError("quantity must not be negative")
+        with self._storage.transaction():
+            now = time.time()
+            entry = self._load(product_id, initial_stock, now)
+            available = self._available(entry, holder)
+            if quantity > available:
+                raise InsufficientStock(product_id, max(available, 0))
+            if quantity > 0:
+                entry["reservations"][holder] = {"quantity": quantity, "expires_at": now + self.ttl}
+            else:
+                entry["reservations"].pop(holder, None)
+            self._entries[product_id] = entry
+        self._changed(product_id)
+
+    def release(self, product_id, holder):
+        """Drop holder's reservation for a SKU, if any"""
+        with self._storage.transaction():
+            entry = self._entries.get(product_id)
+            if entry is not None and entry["reservations"].pop(holder, None) is not None:
+                self._entries[product_id] = entry
+                self._changed(product_id)
+
+    def commit(self, product_id, holder, quantity, initial_stock):
+        """Turn holder's reservation into a sale of quantity units
+
+        If the reservation expired, the units are taken from what is still
+        available instead. Returns the new on-hand count.
+        """
+        if quantity <= 0:
+            raise ValueError("quantity must be positive")
+        with self._storage.transaction():
+            entry = self._load(product_id, initial_stock, time.time())
+            available = self._available(entry, holder)
+            if quantity > available:
+                raise InsufficientStock(product_id, max(available, 0))
+            entry["reservations"].pop(holder, None)
+            entry["on_hand"] -= quantity
+            self._entries[product_id] = entry
+        self._changed(product_id)
+        return entry["on_hand"]
+
+    def _changed(self, product_id):
+        if self.on_change is not None:
+            self.on_change(product_id)
@@ -0,0 +1,63 @@
+"""
+Owner authorization for QUALITY Store
+
+Owners are identified by phone number. An owner logs in with a security key
+derived from their phone number, the server secret and the current (local)
+date, so every key changes at midnight.
+
+OwnerRegistry holds the owner phone numbers as a frozenset and today's keys
+in a dict, computed once per day rather than per request. Keys are rotated
+by rotate_daily() at midnight; lookups also rotate if they notice the day
+has changed, so a late scheduler never serves yesterday's keys.
+"""
+
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+
+def derive_security_key(phone_number, secret, day):
+    """The security key for phone_number on day (a YYYY-MM-DD string)"""
+    raw_data = f"{phone_number}_{secret}_{day}"
+    return hashlib.sha256(raw_data.encode()).hexdigest()[:12].upper()
+
+
+def parse_owner_phones(value):
+    """Parse a comma-separated list of phone numbers"""
+    return frozenset(phone.strip() for phone in value.split(",") if phone.strip())
+
+
+class OwnerRegistry:
+    """Authorized owner phone numbers and their security keys for today"""
+
+    def __init__(self, phones, secret):
+        self.phones = frozenset(phones)
+        self._secret = secret
+        self._keys = {}
+        self._rotate_at = 0.0
+        self.rotate()
+
+    def __contains__(self, phone_number):
+        return phone_number in self.phones
+
+    def rotate(self):
+        """Compute today's keys and schedule the next rotation for midnight"""
+        now = datetime.now()
+        day = now.strftime("%Y-%m-%d")
+        self._keys = {phone: derive_security_key(phone, self._secret, day) for phone in self.phones}
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self._rotate_at = midnight.timestamp()
+
+    def security_key(self, phone_number):
+        """Today's key for an owner, or None if phone_number is not an owner"""
+        if time.time() >= self._rotate_at:
+            self.rotate()
+        return self._keys.get(phone_number)
+
+    async def rotate_daily(self):
+        """Rotate keys at every midnight; run as a background task"""
+        while True:
+            await asyncio.sleep(max(self._rotate_at - time.time(), 0))
+            if time.time() >= self._rotate_at:
+                self.rotate()
@@ -0,0 +1,81 @@
+"""
+Password hashing for QUALITY Store
+
+Passwords are stored as salted scrypt hashes in the form
+"scrypt$<n>$<r>$<p>$<salt>$<hash>" (salt and hash base64 encoded), so the
+cost parameters can be raised later without invalidating existing hashes.
+
+scrypt is deliberately slow, so hashing and verification run on a small
+thread pool (hashlib releases the GIL while it works) rather than on the
+event loop. The pool size bounds how much CPU a burst of logins can take
+from other requests.
+
+Hashes from before the switch are bare unsalted SHA-256 hex digests. They
+are still accepted, and verify() reports that they need rehashing so the
+caller can upgrade them after a successful login.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+ALGORITHM = "scrypt"
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+class PasswordHasher:
+    """Salted scrypt hashing on a bounded thread pool"""
+
+    def __init__(self, n=2 ** 14, r=8, p=1, max_workers=4):
+        self.n = n
+        self.r = r
+        self.p = p
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="passwords")
+
+    @staticmethod
+    def _scrypt(password, salt, n, r, p):
+        # scrypt uses about 128 * n * r bytes; allow twice that
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=HASH_BYTES
+        )
+
+    def hash_sync(self, password):
+        salt = os.urandom(SALT_BYTES)
+        digest = self._scrypt(password, salt, self.n, self.r, self.p)
+        return f"{ALGORITHM}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(digest)}"
+
+    def verify_sync(self, password, stored):
+        """Return (valid, needs_rehash) for a password against a stored hash"""
+        if "$" not in stored:
+            # Legacy unsalted SHA-256
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(stored, legacy), True
+        try:
+            algorithm, n, r, p, salt, expected = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            salt, expected = base64.b64decode(salt), base64.b64decode(expected)
+        except ValueError:
+            return False, False
+        if algorithm != ALGORITHM:
+            return False, False
+        valid = hmac.compare_digest(self._scrypt(password, salt, n, r, p), expected)
+        return valid, valid and (n, r, p) != (self.n, self.r, self.p)
+
+    async def hash(self, password):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.hash_sync, password)
+
+    async def verify(self, password, stored):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.verify_sync, password, stored
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,109 @@
+"""
+Rate limiting for QUALITY Store
+
+Token buckets keyed by client (IP address, phone number or email). Each key
+may spend up to `burst` requests at once and regains `rate` requests per
+second. Checking a bucket is a dictionary read and write, so rejecting a
+request costs far less than the password hashing or token signing it
+protects.
+
+Bucket state lives in a pluggable store: MemoryBucketStore keeps it in
+process (bounded, least recently used keys are forgotten first) and
+SharedBucketStore keeps it in a storage repository so that every worker
+process draws from the same buckets. A bucket that has refilled completely
+is the same as no bucket at all, so each one is stored with the time it
+will be full again, and the shared store's sweep() deletes the rows past it.
+"""
+
+import contextlib
+import time
+from collections import OrderedDict
+
+
+class MemoryBucketStore:
+    """Per-process bucket state, bounded to max_keys"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def get(self, key):
+        return self._buckets.get(key)
+
+    def set(self, key, state, expires_at):
+        self._buckets[key] = state
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            # A forgotten bucket starts full again, which errs on the lenient side
+            self._buckets.popitem(last=False)
+
+    def transaction(self):
+        # Buckets are only touched from the event loop, between awaits
+        return contextlib.nullcontext()
+
+
+class SharedBucketStore:
+    """Bucket state in a storage repository, shared by every worker
+
+    Rows carry their expiry; call sweep() periodically to delete expired ones.
+    """
+
+    def __init__(self, storage, name="rate_limits", sweep_batch=500):
+        self.sweep_batch = sweep_batch
+        self._buckets = storage.repository(name)
+        self.transaction = storage.transaction
+
+    def get(self, key):
+        return self._buckets.get(key)
+
+    def set(self, key, state, expires_at):
+        self._buckets[key] = [*state, expires_at]
+
+    def sweep(self, now=None):
+        """Delete buckets that have refilled completely and return how many were deleted"""
+        now = time.time() if now is None else now
+        expired = [key for key, state in self._buckets.items() if self._expired(state, now)]
+        removed = 0
+        for start in range(0, len(expired), self.sweep_batch):
+            batch = expired[start:start + self.sweep_batch]
+            with self.transaction():
+                self._buckets.lock(batch)
+                for key in batch:
+                    # Skip buckets another worker drew from since the scan
+                    if self._expired(self._buckets.get(key), now):
+                        del self._buckets[key]
+                        removed += 1
+        return removed
+
+    @staticmethod
+    def _expired(state, now):
+        # Rows written before expiries were stored have no third element
+        return state is not None and (len(state) < 3 or state[2] <= now)
+
+
+class RateLimiter:
+    """Token-bucket limiter: burst requests at once, refilled at rate per second"""
+
+    def __init__(self, rate, burst, store=None):
+        self.rate = rate
+        self.burst = burst
+        self.store = store if store is not None else MemoryBucketStore()
+
+    def acquire(self, key):
+        """Spend one request from key's bucket
+
+        Returns 0 if the request is allowed, otherwise the number of seconds
+        until the bucket has a request to spend again.
+        """
+        now = time.time()
+        with self.store.transaction():
+            state = self.store.get(key)
+            if state is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            if tokens < 1:
+                return (1 - tokens) / self.rate
+            tokens -= 1
+            self.store.set(key, [tokens, now], expires_at=now + (self.burst - tokens) / self.rate)
+            return 0
@@ -1,16 +1,39 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, BackgroundTasks
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 import base64
-from typing import List, Optional
-import hashlib
+from typing import List, Literal, Optional
 import secrets
 import jwt
+import asyncio
+import itertools
+import json
+import logging
+import math
+import time
+import uuid
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from cache import ResponseCache, TokenCache, etag_matches
+from cart import Cart, to_cents
+from catalog import ProductCatalog
+from catalog_export import MEDIA_TYPES, chunked, encode_records
+from events import ProductEvents
+from catalog_import import ImportFormatError, iter_csv, iter_ndjson, validate_product_row
+from images import BlobStore, BlobResponse, ThumbnailPipeline, decode_image_data
+from inventory import InsufficientStock, StockLedger
+from owners import OwnerRegistry, parse_owner_phones
+from passwords import PasswordHasher
+from ratelimit import MemoryBucketStore, RateLimiter, SharedBucketStore
+from sessions import SessionStore
+from storage import open_storage
+
 app = FastAPI(title="QUALITY Store API", description="Grocery Store Management System")
+logger = logging.getLogger(__name__)
 
 # CORS configuration
 app.add_middleware(
@@ -23,14 +46,18 @@ app.add_middleware(
 
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 SECRET_KEY = "quality_store_secret_key_2024"
 ALGORITHM = "HS256"
+TOKEN_LIFETIME = timedelta(hours=24)
 
-# Authorized owner phone numbers (only these 2 can be owners)
-AUTHORIZED_OWNER_PHONES = [
-    "+85254061680",  # Owner 1
+# Authorized owner phone numbers, comma-separated in OWNER_PHONES
+AUTHORIZED_OWNER_PHONES = parse_owner_phones(os.environ.get(
+    "OWNER_PHONES",
+    "+85254061680,"  # Owner 1
     "+85211223344"   # Owner 2 (example second number)
-]
+))
+owner_registry = OwnerRegistry(AUTHORIZED_OWNER_PHONES, SECRET_KEY)
 
 # Sample data with expanded categories and products
 SAMPLE_PRODUCTS = [
@@ -73,14 +100,280 @@ SAMPLE_PRODUCTS = [
     {"id": "24", "name": "Fresh Basil", "category": "spices", "price": 1.99, "image_url": "https://images.unsplash.com/photo-1618375569909-0b8a69d3eb5c?w=300", "description": "Fresh basil leaves", "owner_uploaded": False, "stock": 30},
 ]
 
+# Content-addressed store for owner-uploaded images
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "blobs"))
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Used for ?w= requests answered with the original while variants are still being generated
+PENDING_IMAGE_CACHE_CONTROL = "public, max-age=60"
+IMAGE_URL_PREFIX = "/api/images/"
+blob_store = BlobStore(BLOB_STORE_DIR)
+thumbnails = ThumbnailPipeline(blob_store, max_workers=int(os.environ.get("THUMBNAIL_WORKERS", "2")))
+
+# Largest page a client may request from /api/products
+MAX_PAGE_SIZE = 200
+
+# Product fields /api/products?fields= can project, in response order
+PRODUCT_FIELDS = ("id", "name", "category", "price", "description", "image_url", "owner_uploaded", "uploaded_by", "stock")
+
+# Most operations accepted by one /api/customer/cart/batch request
+MAX_CART_BATCH_OPERATIONS = 500
+# Imported rows are written and indexed this many at a time
+IMPORT_BATCH_SIZE = 500
+
 CATEGORIES = ["fruits", "vegetables", "pulses", "dairy", "grains", "bakery", "spices", "beverages", "snacks", "meat"]
 
+# Persistent state backend: in-memory unless DATABASE_URL points at SQLite or Postgres
+storage = open_storage(os.environ.get("DATABASE_URL"), pool_size=int(os.environ.get("DATABASE_POOL_SIZE", "5")))
+
 # Data stores
-users_store = {}
-customer_users = {}
-owner_sessions = {}
-customer_sessions = {}
-uploaded_products = []
+users_store = storage.repository("users_store")
+customer_users = storage.repository("customer_users")
+customer_emails = storage.repository("customer_emails")  # normalized email -> customer_id
+
+# Verified bearer tokens. With shared storage another worker may end a
+# session, so entries are also capped at TOKEN_CACHE_MAX_AGE seconds there.
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_AGE = float(os.environ.get("TOKEN_CACHE_MAX_AGE", "60")) if storage.shared else None
+owner_token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_AGE)
+customer_token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_AGE)
+
+# One session per issued token; a token is only accepted while its session
+# lives, and its cached verification is dropped when the session ends
+SESSION_LIMIT = int(os.environ.get("SESSION_LIMIT", "100000"))
+owner_sessions = SessionStore(
+    storage, "owner_sessions", TOKEN_LIFETIME.total_seconds(), SESSION_LIMIT, on_end=owner_token_cache.discard
+)
+customer_sessions = SessionStore(
+    storage, "customer_sessions", TOKEN_LIFETIME.total_seconds(), SESSION_LIMIT, on_end=customer_token_cache.discard
+)
+
+# Customer ids predate the UUID user ids of the carts and orders tables, so each maps to a fixed UUID
+CUSTOMER_UUID_NAMESPACE = uuid.UUID("c044704e-5b78-428f-910a-33b7d3dff829")
+
+def customer_uuid(customer_id: str) -> str:
+    """The UUID that stands for a customer in the user_id columns of SQL tables"""
+    return str(uuid.uuid5(CUSTOMER_UUID_NAMESPACE, customer_id))
+
+# One cart per customer, a row each in the carts table of supabase_schema.sql
+# keyed by customer_uuid(customer_id)
+CART_COLUMNS = {"id": "uuid", "user_id": "uuid", "items": "json", "total": "decimal", "updated_at": "timestamp"}
+customer_carts = storage.table(
+    "carts",
+    CART_COLUMNS,
+    encode=lambda key, cart: {
+        "user_id": key,
+        "items": cart.to_document(),
+        "total": cart.total,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    },
+    decode=lambda row: Cart.from_document(row["items"]),
+)
+
+uploaded_products = storage.repository("uploaded_products")
+
+# Placed orders, one row each in the orders table of supabase_schema.sql
+ORDER_COLUMNS = {
+    "id": "uuid",
+    "user_id": "uuid",
+    "items": "json",
+    "total": "decimal",
+    "status": "text",
+    "delivery_address": "text",
+    "delivery_date": "date",
+    "delivery_time": "text",
+    "payment_status": "text",
+    "created_at": "timestamp",
+    "updated_at": "timestamp",
+}
+customer_orders = storage.table("orders", ORDER_COLUMNS)
+customer_order_ids = storage.repository("customer_order_ids")  # customer_id -> [order_id, ...]
+
+# Product catalog (indexed by id, category and uploading owner)
+catalog = ProductCatalog(itertools.chain(SAMPLE_PRODUCTS, uploaded_products.values()))
+
+# Per-SKU on-hand stock and expiring cart reservations
+stock_ledger = StockLedger(storage, ttl=int(os.environ.get("STOCK_RESERVATION_TTL", "1800")))
+
+# Push channel: open cart connections subscribe to the products in their cart
+product_events = ProductEvents()
+catalog.on_change = product_events.publish
+stock_ledger.on_change = product_events.publish
+CART_EVENTS_COALESCE_DELAY = float(os.environ.get("CART_EVENTS_COALESCE_DELAY", "0.25"))
+CART_EVENTS_HEARTBEAT = 15.0
+# Open event streams close within this many seconds of their session ending
+CART_EVENTS_SESSION_CHECK = 5.0
+
+# Recent catalog changes (changed product ids, keyed by catalog version) and
+# stock levels published by checkouts (keyed by stock version), so other
+# workers reload only what changed and exports can send deltas
+catalog_changes = storage.repository("catalog_changes")
+stock_changes = storage.repository("stock_changes")
+CHANGE_LOG_SIZE = 1000
+
+def storage_epoch() -> str:
+    """Random id of this store's version history, created on first use
+    
+    Catalog and stock versions restart if the store is reset, so version
+    tokens carry the epoch to tell them apart.
+    """
+    store_metadata = storage.repository("store_metadata")
+    with storage.transaction():
+        store_metadata.lock(["epoch"])
+        epoch = store_metadata.get("epoch")
+        if epoch is None:
+            epoch = store_metadata["epoch"] = secrets.token_hex(4)
+    return epoch
+
+CATALOG_EPOCH = storage_epoch()
+
+# Catalog and stock versions this worker last synced from shared storage, and when it checked
+CATALOG_SYNC_INTERVAL = float(os.environ.get("CATALOG_SYNC_INTERVAL", "0.5"))
+catalog_sync = {
+    "version": storage.current_value("catalog_version"),
+    "stock_version": storage.current_value("stock_version"),
+    "checked_at": 0.0,
+}
+
+def publish_catalog_change(product_ids: List[str]):
+    """Log persisted catalog changes for other workers and exports"""
+    with storage.transaction():
+        version = storage.next_value("catalog_version")
+        catalog_changes[str(version)] = list(product_ids)
+        catalog_changes.pop(str(version - CHANGE_LOG_SIZE), None)
+    # Changes other workers logged in between are still to be loaded
+    if catalog_sync["version"] == version - 1:
+        catalog_sync["version"] = version
+
+def sync_catalog():
+    """Reload owner uploads and stock levels changed by other workers
+    
+    A no-op without shared storage. Checks the shared catalog and stock
+    versions at most once per CATALOG_SYNC_INTERVAL.
+    """
+    if not storage.shared:
+        return
+    now = time.monotonic()
+    if now - catalog_sync["checked_at"] < CATALOG_SYNC_INTERVAL:
+        return
+    catalog_sync["checked_at"] = now
+    
+    version = storage.current_value("catalog_version")
+    stock_version = storage.current_value("stock_version")
+    if version != catalog_sync["version"]:
+        changes = logged_changes(catalog_changes, catalog_sync["version"], version)
+        if changes is None:
+            persisted = {p["id"]: p for p in uploaded_products.values()}
+            for product in catalog.owner_uploaded():
+                if product["id"] not in persisted:
+                    catalog.remove(product["id"])
+        else:
+            changed = set(itertools.chain.from_iterable(changes))
+            persisted = {pid: uploaded_products.get(pid) for pid in changed}
+        for product_id, product in persisted.items():
+            current = catalog.get(product_id)
+            if product is None:
+                if current is not None and current.get("owner_uploaded"):
+                    catalog.remove(product_id)
+            # Stock shown in the catalog comes from the ledger, not the upload
+            elif current is None or {**current, "stock": product.get("stock")} != product:
+                catalog.add(product)
+                catalog.set_stock(product_id, stock_ledger.on_hand(product_id, product.get("stock", 0)))
+        catalog_sync["version"] = version
+    if stock_version != catalog_sync["stock_version"]:
+        changes = logged_changes(stock_changes, catalog_sync["stock_version"], stock_version)
+        if changes is None:
+            apply_stock_levels(stock_ledger.on_hand_levels())
+        else:
+            for levels in changes:
+                apply_stock_levels(levels)
+        catalog_sync["stock_version"] = stock_version
+
+def logged_changes(log, since, until) -> Optional[list]:
+    """Return the entries of a change log after version since up to until, oldest first
+    
+    None when the log no longer covers that range.
+    """
+    if not 0 <= until - since <= CHANGE_LOG_SIZE:
+        return None
+    changes = []
+    for version in range(since + 1, until + 1):
+        entry = log.get(str(version))
+        if entry is None:
+            return None
+        changes.append(entry)
+    return changes
+
+def publish_stock_levels(levels: dict):
+    """Show new on-hand counts here and log them for other workers and exports"""
+    apply_stock_levels(levels)
+    with storage.transaction():
+        version = storage.next_value("stock_version")
+        stock_changes[str(version)] = levels
+        stock_changes.pop(str(version - CHANGE_LOG_SIZE), None)
+    if catalog_sync["stock_version"] == version - 1:
+        catalog_sync["stock_version"] = version
+
+def catalog_version_token() -> str:
+    """Opaque token for the catalog state this worker serves, for export clients"""
+    return f"{CATALOG_EPOCH}.{catalog_sync['version']}.{catalog_sync['stock_version']}"
+
+def catalog_changes_since(token: str) -> Optional[list]:
+    """Return [(product_id, product or None if removed)] changed since a version token
+    
+    None if the token is malformed, from another store, or older than the
+    change logs reach.
+    """
+    epoch, _, versions = token.partition(".")
+    version, _, stock_version = versions.partition(".")
+    if epoch != CATALOG_EPOCH or not version.isdigit() or not stock_version.isdigit():
+        return None
+    changes = logged_changes(catalog_changes, int(version), catalog_sync["version"])
+    stock = logged_changes(stock_changes, int(stock_version), catalog_sync["stock_version"])
+    if changes is None or stock is None:
+        return None
+    # Each product once, with its current state, in the order it first changed
+    changed = dict.fromkeys(itertools.chain(itertools.chain.from_iterable(changes), *stock))
+    return [(product_id, catalog.get(product_id)) for product_id in changed]
+
+def apply_stock_levels(levels: dict):
+    """Update the stock shown in catalog products to ledger on-hand counts"""
+    for product_id, on_hand in levels.items():
+        catalog.set_stock(product_id, on_hand)
+
+# Show stock left by earlier runs rather than the seed counts
+apply_stock_levels(stock_ledger.on_hand_levels())
+
+# Encoded catalog responses, invalidated whenever catalog.version changes or
+# a product they show changes stock
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "1024")),
+    max_bytes=int(os.environ.get("RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024)))
+)
+
+# Password hashing cost (scrypt n, r, p) and the size of its thread pool
+password_hasher = PasswordHasher(
+    n=int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14))),
+    r=int(os.environ.get("PASSWORD_SCRYPT_R", "8")),
+    p=int(os.environ.get("PASSWORD_SCRYPT_P", "1")),
+    max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "4")),
+)
+
+# Throttling for login, registration and owner key generation: one bucket per
+# client IP and one per phone number or email. Shared across workers when
+# the storage backend is.
+rate_limit_store = SharedBucketStore(storage) if storage.shared else MemoryBucketStore()
+# How often expired buckets are deleted from shared storage, in seconds
+RATE_LIMIT_SWEEP_INTERVAL = float(os.environ.get("RATE_LIMIT_SWEEP_INTERVAL", "60"))
+ip_rate_limiter = RateLimiter(
+    rate=float(os.environ.get("AUTH_IP_RATE_PER_MINUTE", "60")) / 60,
+    burst=int(os.environ.get("AUTH_IP_BURST", "30")),
+    store=rate_limit_store,
+)
+identity_rate_limiter = RateLimiter(
+    rate=float(os.environ.get("AUTH_IDENTITY_RATE_PER_MINUTE", "10")) / 60,
+    burst=int(os.environ.get("AUTH_IDENTITY_BURST", "10")),
+    store=rate_limit_store,
+)
 
 class CustomerRegister(BaseModel):
     name: str
@@ -110,81 +403,288 @@ class ProductUpload(BaseModel):
     price: float
     description: str
     image_data: str  # base64 encoded
+    stock: int = 0
 
 def generate_security_key(phone_number: str) -> str:
-    """Generate a unique security key based on phone number and timestamp"""
-    # Create a hash based on phone number + secret + current day
-    current_day = datetime.now().strftime("%Y-%m-%d")
-    raw_data = f"{phone_number}_{SECRET_KEY}_{current_day}"
-    
-    # Generate SHA256 hash and take first 12 characters
-    hash_object = hashlib.sha256(raw_data.encode())
-    security_key = hash_object.hexdigest()[:12].upper()
-    
-    return security_key
+    """Today's security key for an owner phone number (None if not an owner)"""
+    return owner_registry.security_key(phone_number)
 
-def verify_owner_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify if the request is from an authenticated owner"""
+@app.on_event("startup")
+async def start_owner_key_rotation():
+    app.state.owner_key_rotation = asyncio.create_task(owner_registry.rotate_daily())
+
+async def sweep_rate_limits():
+    """Delete expired shared rate-limit buckets every RATE_LIMIT_SWEEP_INTERVAL; run as a background task"""
+    while True:
+        await asyncio.sleep(RATE_LIMIT_SWEEP_INTERVAL)
+        try:
+            await run_in_threadpool(rate_limit_store.sweep)
+        except Exception:
+            logger.exception("Rate limit sweep failed")
+
+@app.on_event("startup")
+async def start_rate_limit_sweep():
+    if storage.shared:
+        app.state.rate_limit_sweep = asyncio.create_task(sweep_rate_limits())
+
+def issue_token(claims: dict, sessions: SessionStore, subject: str) -> str:
+    """Sign a token carrying claims and start its session"""
+    expires_at = datetime.now(timezone.utc) + TOKEN_LIFETIME
+    # jti keeps tokens (and so sessions) distinct even when issued in the same second
+    token = jwt.encode({**claims, "exp": expires_at, "jti": secrets.token_urlsafe(12)}, SECRET_KEY, algorithm=ALGORITHM)
+    sessions.create(token, subject, expires_at.timestamp())
+    return token
+
+def decode_token(token: str, sessions: SessionStore) -> dict:
+    """Decode and verify a bearer token, rejecting it if its session has ended"""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        phone_number = payload.get("phone_number")
-        
-        if phone_number not in AUTHORIZED_OWNER_PHONES:
-            raise HTTPException(status_code=403, detail="Access denied: Not an authorized owner")
-        
-        return {"phone_number": phone_number, "is_owner": True}
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if sessions.get(token) is None:
+        raise HTTPException(status_code=401, detail="Session ended")
+    return payload
+
+def verify_owner_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify if the request is from an authenticated owner"""
+    token = credentials.credentials
+    now = time.time()
+    owner = owner_token_cache.get(token, now)
+    if owner is not None:
+        return owner
+    
+    payload = decode_token(token, owner_sessions)
+    phone_number = payload.get("phone_number")
+    
+    if phone_number not in owner_registry:
+        raise HTTPException(status_code=403, detail="Access denied: Not an authorized owner")
+    
+    owner = {"phone_number": phone_number, "is_owner": True}
+    owner_token_cache.put(token, owner, payload.get("exp", now), now)
+    return owner
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+def cached_json_response(request: Request, key: tuple, build):
+    """Serve a JSON payload from the response cache, building it on a miss
+    
+    Answers 304 when the client's If-None-Match matches the cached ETag.
+    """
+    entry = response_cache.get(key, catalog.version, catalog.stock_changed_since)
+    if entry is None:
+        stock_version = catalog.stock_version
+        payload = build()
+        products = frozenset(product["id"] for product in payload.get("products", ()))
+        entry = response_cache.put(key, catalog.version, JSONResponse(payload).body, products, stock_version)
+    
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 @app.get("/api/categories")
-async def get_categories():
-    return {"categories": CATEGORIES}
+async def get_categories(request: Request):
+    return cached_json_response(request, ("categories",), lambda: {"categories": CATEGORIES})
+
+@app.get("/api/products/export")
+async def export_products(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[str] = None
+):
+    """Stream the catalog as NDJSON or CSV for partners
+    
+    With since=<X-Catalog-Version of an earlier export>, only products
+    changed or removed after that version are sent. Tokens are valid
+    across workers sharing the same store until the change logs move
+    past them; an older or foreign token gets a full export, reported
+    in X-Export-Type.
+    """
+    sync_catalog()
+    version = catalog_version_token()
+    changes = catalog_changes_since(since) if since is not None else None
+    if changes is not None:
+        export_type = "delta"
+    else:
+        # Snapshot product references only; records are encoded as they stream
+        changes = ((product["id"], product) for product in list(catalog))
+        export_type = "full"
+    
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"X-Catalog-Version": version, "X-Export-Type": export_type, "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        chunked(encode_records(changes, format), compress=compress),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
 
 @app.get("/api/products")
-async def get_products(search: Optional[str] = None, category: Optional[str] = None):
-    products = SAMPLE_PRODUCTS.copy()
+async def get_products(
+    request: Request,
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    image_width: Optional[int] = Query(None, ge=1),
+):
+    """List products, optionally paginated with limit/cursor and projected with fields
+    
+    image_width rewrites uploaded image URLs to the variant sized for that width.
+    """
+    sync_catalog()
+    # Canonicalize client-chosen parameters so equivalent requests share a cache entry
+    fields = project_fields(fields)
+    image_width = variant_width(image_width) if image_width else None
+    key = ("products", search, category, limit, cursor, fields, image_width)
+    return cached_json_response(
+        request, key, lambda: list_products(search, category, limit, cursor, fields, image_width)
+    )
+
+def project_fields(fields: Optional[str]) -> Optional[tuple]:
+    """Known product fields named in a comma-separated fields parameter, in canonical order
+    
+    Always keeps the id so clients can fetch the full product later.
+    """
+    if not fields:
+        return None
+    requested = set(fields.split(","))
+    return tuple(f for f in PRODUCT_FIELDS if f == "id" or f in requested)
+
+def variant_width(width: int) -> Optional[int]:
+    """The smallest image variant width at least width, or None to keep the original"""
+    return next((w for w in thumbnails.widths if w >= width), None)
+
+def list_products(search, category, limit, cursor, fields, image_width):
+    """Build the /api/products payload"""
+    try:
+        products, next_cursor = catalog.page(search, category, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    if search:
-        products = [p for p in products if search.lower() in p["name"].lower()]
+    if fields:
+        products = [{f: p[f] for f in fields if f in p} for p in products]
     
-    if category:
-        products = [p for p in products if p["category"] == category]
+    if image_width:
+        products = [sized_image_product(p, image_width) for p in products]
     
-    return {"products": products}
+    if limit is None and cursor is None:
+        return {"products": products}
+    return {"products": products, "next_cursor": next_cursor}
+
+@app.api_route("/api/images/{digest}", methods=["GET", "HEAD"])
+async def get_image(digest: str, request: Request, w: Optional[int] = Query(None, ge=1)):
+    """Serve an uploaded image blob by content hash, honouring Range requests
+    
+    With ?w=<width> the smallest resized variant at least that wide is served.
+    """
+    image = await run_in_threadpool(locate_image, digest, w)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    digest, size, content_type, final = image
+    
+    cache_control = IMAGE_CACHE_CONTROL if final else PENDING_IMAGE_CACHE_CONTROL
+    # Blobs are immutable, so the digest is a strong validator
+    headers = {"ETag": f'"{digest}"', "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    # A stale If-Range validator means the client must refetch the whole blob
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != headers["ETag"]:
+        range_header = None
+    
+    return BlobResponse(
+        blob_store.path(digest),
+        media_type=content_type,
+        headers=headers,
+        range_header=range_header,
+        method=request.method,
+        size=size,
+    )
+
+def locate_image(digest: str, width: Optional[int]):
+    """Find the blob to serve for an image and width (blocking file I/O)
+    
+    Returns (digest, size, content type, final) or None if the image is
+    missing. final is False when the original stands in for a variant
+    that is still being generated.
+    """
+    if blob_store.info(digest) is None:
+        return None
+    final = True
+    if width:
+        served = thumbnails.variant(digest, width)
+        final = served != digest or thumbnails.is_final(digest)
+        digest = served
+    info = blob_store.info(digest)
+    if info is None:
+        return None
+    return (digest, *info, final)
+
+def sized_image_product(product: dict, width: int) -> dict:
+    """Return product with an uploaded image URL pointing at the variant for width"""
+    image_url = product.get("image_url")
+    if not image_url or not image_url.startswith(IMAGE_URL_PREFIX):
+        return product
+    return {**product, "image_url": f"{image_url}?w={width}"}
 
 @app.get("/api/products/{product_id}")
 async def get_product(product_id: str):
-    product = next((p for p in SAMPLE_PRODUCTS if p["id"] == product_id), None)
+    sync_catalog()
+    product = catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
 # Customer Authentication Endpoints
+def normalize_email(email: str) -> str:
+    """Canonical form of an email address for uniqueness checks and lookups"""
+    return email.strip().lower()
+
+def enforce_rate_limits(http_request: Request, identity: str):
+    """Reject with 429 if the client's IP or the identity it claims is over its limit"""
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    retry_after = ip_rate_limiter.acquire(f"ip:{client_ip}") or identity_rate_limiter.acquire(identity)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
 @app.post("/api/customer/register")
-async def customer_register(customer: CustomerRegister):
+async def customer_register(customer: CustomerRegister, http_request: Request):
     """Register new customer"""
-    # Check if email already exists
-    for user_data in customer_users.values():
-        if user_data["email"] == customer.email:
-            raise HTTPException(status_code=400, detail="Email already registered")
+    email_key = normalize_email(customer.email)
+    enforce_rate_limits(http_request, f"email:{email_key}")
+    if email_key in customer_emails:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    password_hash = await password_hasher.hash(customer.password)
     
-    # Create new customer
-    customer_id = f"customer_{len(customer_users) + 1}"
-    customer_users[customer_id] = {
-        "id": customer_id,
-        "name": customer.name,
-        "email": customer.email,
-        "password": hashlib.sha256(customer.password.encode()).hexdigest(),  # Hash password
-        "phone": customer.phone,
-        "created_at": datetime.now().isoformat()
-    }
+    with storage.transaction():
+        # Check if email already exists
+        if email_key in customer_emails:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        
+        # Create new customer
+        customer_id = f"customer_{storage.next_value('customer_id')}"
+        customer_users[customer_id] = {
+            "id": customer_id,
+            "name": customer.name,
+            "email": customer.email,
+            "password": password_hash,
+            "phone": customer.phone,
+            "created_at": datetime.now().isoformat()
+        }
+        customer_emails[email_key] = customer_id
     
     return {
         "message": "Customer registered successfully",
@@ -192,35 +692,37 @@ async def customer_register(customer: CustomerRegister):
     }
 
 @app.post("/api/customer/login")
-async def customer_login(login_data: CustomerLogin):
+async def customer_login(login_data: CustomerLogin, http_request: Request):
     """Customer login"""
-    hashed_password = hashlib.sha256(login_data.password.encode()).hexdigest()
-    
-    # Find customer by email and password
-    customer = None
-    for user_data in customer_users.values():
-        if user_data["email"] == login_data.email and user_data["password"] == hashed_password:
-            customer = user_data
-            break
+    email_key = normalize_email(login_data.email)
+    enforce_rate_limits(http_request, f"email:{email_key}")
     
+    # Find customer by email, then check password
+    customer_id = customer_emails.get(email_key)
+    customer = customer_users.get(customer_id)
     if not customer:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Generate JWT token
+    valid, needs_rehash = await password_hasher.verify(login_data.password, customer["password"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    # Upgrade legacy or lower-cost hashes now that we know the password
+    if needs_rehash:
+        password_hash = await password_hasher.hash(login_data.password)
+        with storage.transaction():
+            current = customer_users.get(customer_id)
+            if current and current["password"] == customer["password"]:
+                current["password"] = password_hash
+                customer_users[customer_id] = current
+    
+    # Generate JWT token and its session
     token_data = {
         "customer_id": customer["id"],
         "email": customer["email"],
-        "is_customer": True,
-        "exp": datetime.utcnow() + timedelta(hours=24)
-    }
-    
-    token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
-    
-    # Store session
-    customer_sessions[customer["id"]] = {
-        "token": token,
-        "login_time": datetime.now().isoformat()
+        "is_customer": True
     }
+    token = issue_token(token_data, customer_sessions, customer["id"])
     
     return {
         "message": "Login successful",
@@ -234,19 +736,29 @@ async def customer_login(login_data: CustomerLogin):
 
 def verify_customer_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify customer token"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        customer_id = payload.get("customer_id")
-        
-        if not customer_id or customer_id not in customer_users:
-            raise HTTPException(status_code=401, detail="Invalid customer token")
-        
-        return customer_users[customer_id]
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    return customer_from_token(credentials.credentials)
+
+def customer_from_token(token: str) -> dict:
+    """Return the customer a bearer token belongs to, or raise a 401"""
+    now = time.time()
+    customer = customer_token_cache.get(token, now)
+    if customer is not None:
+        return customer
+    
+    payload = decode_token(token, customer_sessions)
+    customer = customer_users.get(payload.get("customer_id"))
+    
+    if not customer:
+        raise HTTPException(status_code=401, detail="Invalid customer token")
+    
+    customer_token_cache.put(token, customer, payload.get("exp", now), now)
+    return customer
+
+@app.post("/api/customer/logout")
+async def customer_logout(credentials: HTTPAuthorizationCredentials = Depends(security), customer: dict = Depends(verify_customer_token)):
+    """Customer logout: end the session of the token used for this request"""
+    customer_sessions.revoke(credentials.credentials)
+    return {"message": "Logged out successfully"}
 
 @app.get("/api/customer/profile")
 async def get_customer_profile(customer: dict = Depends(verify_customer_token)):
@@ -263,88 +775,258 @@ async def get_customer_profile(customer: dict = Depends(verify_customer_token)):
 # Shopping Cart Endpoints
 class CartItem(BaseModel):
     product_id: str
-    quantity: int
+    quantity: int = Field(gt=0)
+
+class CartOperation(BaseModel):
+    op: Literal["add", "set", "remove"]
+    product_id: str
+    quantity: int = 0
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation]
+
+class CheckoutRequest(BaseModel):
+    delivery_address: str
+    delivery_date: date
+    delivery_time: str
+
+def product_price_cents(product_id: str):
+    """Current catalog price of a product in cents, or None if it is gone"""
+    product = catalog.get(product_id)
+    return to_cents(product["price"]) if product else None
 
-customer_carts = {}
+def reserve_stock(product: dict, customer_id: str, quantity: int, detail: str = "Only {available} items available in stock"):
+    """Hold quantity units of product for a customer's cart, or raise a 400"""
+    try:
+        stock_ledger.reserve(product["id"], customer_id, quantity, product.get("stock", 0))
+    except InsufficientStock as e:
+        raise HTTPException(status_code=400, detail=detail.format(available=e.available))
+
+def save_cart(customer_id: str, cart: Cart):
+    """Persist a customer's cart and point their push connections at its products"""
+    customer_carts[customer_uuid(customer_id)] = cart
+    product_events.follow(customer_id, (line.product_id for line in cart))
+
+def load_cart(customer_id: str) -> Cart:
+    """Return a customer's cart with line prices current for the catalog"""
+    cart = customer_carts.get(customer_uuid(customer_id)) or Cart()
+    cart.ensure_priced(product_price_cents, catalog.price_version)
+    return cart
 
 @app.post("/api/customer/cart/add")
 async def add_to_cart(item: CartItem, customer: dict = Depends(verify_customer_token)):
     """Add item to customer cart"""
     customer_id = customer["id"]
+    sync_catalog()
     
     # Find product
-    product = next((p for p in SAMPLE_PRODUCTS if p["id"] == item.product_id), None)
+    product = catalog.get(item.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Check stock
-    if item.quantity > product["stock"]:
-        raise HTTPException(status_code=400, detail=f"Only {product['stock']} items available in stock")
-    
-    # Initialize cart if doesn't exist
-    if customer_id not in customer_carts:
-        customer_carts[customer_id] = []
-    
-    # Check if item already in cart
-    existing_item = next((cart_item for cart_item in customer_carts[customer_id] if cart_item["product_id"] == item.product_id), None)
-    
-    if existing_item:
-        # Update quantity
-        new_quantity = existing_item["quantity"] + item.quantity
-        if new_quantity > product["stock"]:
-            raise HTTPException(status_code=400, detail=f"Cannot add more items. Only {product['stock']} available, you already have {existing_item['quantity']} in cart")
-        existing_item["quantity"] = new_quantity
-    else:
-        # Add new item
-        customer_carts[customer_id].append({
-            "product_id": item.product_id,
-            "quantity": item.quantity,
-            "added_at": datetime.now().isoformat()
-        })
+    with storage.transaction():
+        cart = load_cart(customer_id)
+        
+        # Reserve stock for the new line quantity
+        existing_item = cart.get(item.product_id)
+        if existing_item:
+            reserve_stock(product, customer_id, existing_item.quantity + item.quantity,
+                          f"Cannot add more items. Only {{available}} available, you already have {existing_item.quantity} in cart")
+        else:
+            reserve_stock(product, customer_id, item.quantity)
+        
+        cart.add(item.product_id, item.quantity, to_cents(product["price"]))
+        save_cart(customer_id, cart)
     
     return {"message": "Item added to cart successfully"}
 
 @app.get("/api/customer/cart")
-async def get_cart(customer: dict = Depends(verify_customer_token)):
-    """Get customer cart with product details"""
+async def get_cart(details: bool = True, customer: dict = Depends(verify_customer_token)):
+    """Get customer cart with product details
+    
+    With details=false only the running totals are returned, without
+    touching individual lines.
+    """
     customer_id = customer["id"]
+    sync_catalog()
     
-    if customer_id not in customer_carts:
-        return {"cart": [], "total": 0}
+    if customer_uuid(customer_id) not in customer_carts:
+        return {"cart": [], "total": 0} if details else Cart().summary()
     
-    cart_with_details = []
-    total = 0
+    cart = load_cart(customer_id)
+    if not details:
+        return cart.summary()
+    return cart_response(cart)
+
+def product_state(product_id: str, customer_id: str) -> dict:
+    """Price and stock of a product as pushed to a customer's cart connection"""
+    product = catalog.get(product_id)
+    if not product:
+        return {"product_id": product_id, "removed": True}
+    stock = product.get("stock", 0)
+    return {
+        "product_id": product_id,
+        "price": product["price"],
+        "stock": stock,
+        "available": max(stock_ledger.available(product_id, stock, holder=customer_id), 0)
+    }
+
+@app.get("/api/customer/cart/events")
+async def cart_events(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Server-sent events with price and stock changes for products in the cart
+    
+    Browsers' EventSource cannot send headers, so the token may also be
+    given as ?token=. The first event carries the state of every product
+    in the cart; later events carry only products whose state changed.
+    The stream ends once the token's session does (logout or expiry).
+    """
+    token = token or (credentials.credentials if credentials else None)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    customer_id = customer_from_token(token)["id"]
+    cart = customer_carts.get(customer_uuid(customer_id)) or Cart()
+    
+    # Poll shared storage so changes made by other workers are pushed too
+    wait = CATALOG_SYNC_INTERVAL if storage.shared else CART_EVENTS_SESSION_CHECK
     
-    for cart_item in customer_carts[customer_id]:
-        product = next((p for p in SAMPLE_PRODUCTS if p["id"] == cart_item["product_id"]), None)
+    async def stream():
+        subscription = product_events.subscribe(customer_id, (line.product_id for line in cart))
+        last_sent = {}
+        last_write = last_session_check = time.monotonic()
+        try:
+            yield "retry: 5000\n\n"
+            changed = set(subscription.products)
+            while True:
+                if time.monotonic() - last_session_check >= CART_EVENTS_SESSION_CHECK:
+                    if customer_sessions.get(token) is None:
+                        return
+                    last_session_check = time.monotonic()
+                updates = []
+                for product_id in changed:
+                    state = product_state(product_id, customer_id)
+                    if last_sent.get(product_id) != state:
+                        last_sent[product_id] = state
+                        updates.append(state)
+                for product_id in list(last_sent):
+                    if product_id not in subscription.products:
+                        del last_sent[product_id]
+                if updates:
+                    yield f"event: cart_update\ndata: {json.dumps({'products': updates})}\n\n"
+                    last_write = time.monotonic()
+                elif time.monotonic() - last_write >= CART_EVENTS_HEARTBEAT:
+                    yield ": keepalive\n\n"
+                    last_write = time.monotonic()
+                changed = await subscription.changes(wait, CART_EVENTS_COALESCE_DELAY)
+                if not changed:
+                    sync_catalog()
+        finally:
+            product_events.unsubscribe(subscription)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def cart_response(cart: Cart) -> dict:
+    """Cart lines with product details plus the cart summary"""
+    cart_with_details = []
+    for cart_item in cart:
+        product = catalog.get(cart_item.product_id)
         if product:
-            item_total = product["price"] * cart_item["quantity"]
-            total += item_total
-            
             cart_with_details.append({
-                "product_id": cart_item["product_id"],
+                "product_id": cart_item.product_id,
                 "product_name": product["name"],
                 "product_price": product["price"],
                 "product_image": product["image_url"],
-                "quantity": cart_item["quantity"],
-                "item_total": item_total
+                "quantity": cart_item.quantity,
+                "item_total": cart_item.total / 100
             })
     
-    return {
-        "cart": cart_with_details,
-        "total": round(total, 2),
-        "items_count": len(cart_with_details)
-    }
+    return {"cart": cart_with_details, **cart.summary()}
+
+@app.post("/api/customer/cart/batch")
+async def batch_update_cart(batch: CartBatch, customer: dict = Depends(verify_customer_token)):
+    """Apply many add/set/remove operations to the cart atomically
+    
+    Operations are applied in order. Stock is checked once per product
+    against its final quantity; if any operation is invalid nothing is
+    applied and every error is reported.
+    """
+    if len(batch.operations) > MAX_CART_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CART_BATCH_OPERATIONS} operations per batch")
+    
+    customer_id = customer["id"]
+    sync_catalog()
+    
+    with storage.transaction():
+        cart = load_cart(customer_id)
+        stock_ledger.lock(operation.product_id for operation in batch.operations)
+        
+        # Work out each touched product's final quantity without mutating the cart
+        final_quantities = {}
+        errors = []
+        for index, operation in enumerate(batch.operations):
+            product_id = operation.product_id
+            current = final_quantities.get(product_id)
+            if current is None:
+                line = cart.get(product_id)
+                current = line.quantity if line else 0
+            
+            if operation.op == "remove":
+                final_quantities[product_id] = 0
+                continue
+            if operation.quantity <= 0:
+                errors.append({"index": index, "product_id": product_id, "detail": "Quantity must be positive"})
+                continue
+            if operation.op == "set" and current == 0:
+                errors.append({"index": index, "product_id": product_id, "detail": "Item not found in cart"})
+                continue
+            final_quantities[product_id] = current + operation.quantity if operation.op == "add" else operation.quantity
+        
+        # Check stock for all touched products in one pass
+        for product_id, quantity in final_quantities.items():
+            if quantity == 0:
+                continue
+            product = catalog.get(product_id)
+            if not product:
+                errors.append({"product_id": product_id, "detail": "Product not found"})
+                continue
+            available = stock_ledger.available(product_id, product.get("stock", 0), holder=customer_id)
+            if quantity > available:
+                errors.append({"product_id": product_id, "detail": f"Only {available} items available in stock"})
+        
+        if errors:
+            raise HTTPException(status_code=400, detail={"message": "Cart batch rejected", "errors": errors})
+        
+        # Nothing can fail from here on, so reservations and cart stay in step
+        for product_id, quantity in final_quantities.items():
+            if quantity == 0:
+                stock_ledger.release(product_id, customer_id)
+                cart.remove(product_id)
+                continue
+            reserve_stock(catalog.get(product_id), customer_id, quantity)
+            unit_price = product_price_cents(product_id)
+            if product_id in cart:
+                cart.set_quantity(product_id, quantity, unit_price)
+            else:
+                cart.add(product_id, quantity, unit_price)
+        save_cart(customer_id, cart)
+    
+    return cart_response(cart)
 
 @app.delete("/api/customer/cart/{product_id}")
 async def remove_from_cart(product_id: str, customer: dict = Depends(verify_customer_token)):
     """Remove item from cart"""
     customer_id = customer["id"]
     
-    if customer_id not in customer_carts:
-        raise HTTPException(status_code=404, detail="Cart is empty")
-    
-    customer_carts[customer_id] = [item for item in customer_carts[customer_id] if item["product_id"] != product_id]
+    with storage.transaction():
+        if customer_uuid(customer_id) not in customer_carts:
+            raise HTTPException(status_code=404, detail="Cart is empty")
+        
+        cart = load_cart(customer_id)
+        if cart.remove(product_id):
+            stock_ledger.release(product_id, customer_id)
+            save_cart(customer_id, cart)
     
     return {"message": "Item removed from cart"}
 
@@ -352,34 +1034,134 @@ async def remove_from_cart(product_id: str, customer: dict = Depends(verify_cust
 async def update_cart_quantity(product_id: str, item: CartItem, customer: dict = Depends(verify_customer_token)):
     """Update item quantity in cart"""
     customer_id = customer["id"]
+    sync_catalog()
     
-    if customer_id not in customer_carts:
+    if customer_uuid(customer_id) not in customer_carts:
         raise HTTPException(status_code=404, detail="Cart is empty")
     
     # Find product to check stock
-    product = next((p for p in SAMPLE_PRODUCTS if p["id"] == product_id), None)
+    product = catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    if item.quantity > product["stock"]:
-        raise HTTPException(status_code=400, detail=f"Only {product['stock']} items available")
+    # Update cart item and its stock reservation
+    with storage.transaction():
+        cart = load_cart(customer_id)
+        if product_id not in cart:
+            raise HTTPException(status_code=404, detail="Item not found in cart")
+        reserve_stock(product, customer_id, item.quantity, "Only {available} items available")
+        cart.set_quantity(product_id, item.quantity, to_cents(product["price"]))
+        save_cart(customer_id, cart)
     
-    # Update cart item
-    cart_item = next((item for item in customer_carts[customer_id] if item["product_id"] == product_id), None)
-    if cart_item:
-        cart_item["quantity"] = item.quantity
-        return {"message": "Cart updated successfully"}
-    else:
-        raise HTTPException(status_code=404, detail="Item not found in cart")
+    return {"message": "Cart updated successfully"}
+
+# Order Endpoints
+@app.post("/api/customer/checkout")
+async def checkout(order_request: CheckoutRequest, background_tasks: BackgroundTasks, customer: dict = Depends(verify_customer_token)):
+    """Turn the customer's cart into an order
+    
+    Stock commits, the order row and clearing the cart happen in one
+    transaction; confirmation and inventory sync run after the response.
+    """
+    customer_id = customer["id"]
+    sync_catalog()
+    
+    with storage.transaction():
+        if customer_uuid(customer_id) not in customer_carts:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        cart = load_cart(customer_id)
+        stock_ledger.lock(line.product_id for line in cart)
+        
+        # Lines whose product has been removed from the catalog are dropped
+        lines = [(line, catalog.get(line.product_id)) for line in cart if line.unit_price is not None]
+        if not lines:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        
+        if any(line.quantity <= 0 for line, _ in lines):
+            raise HTTPException(status_code=400, detail="Cart quantities must be positive")
+        
+        # Check every line before committing any stock, so a failure changes nothing
+        errors = []
+        for line, product in lines:
+            available = stock_ledger.available(line.product_id, product.get("stock", 0), holder=customer_id)
+            if line.quantity > available:
+                errors.append({"product_id": line.product_id, "detail": f"Only {available} items available in stock"})
+        if errors:
+            raise HTTPException(status_code=409, detail={"message": "Some items are no longer available", "errors": errors})
+        
+        stock_levels = {
+            line.product_id: stock_ledger.commit(line.product_id, customer_id, line.quantity, product.get("stock", 0))
+            for line, product in lines
+        }
+        
+        now = datetime.now(timezone.utc).isoformat()
+        order = {
+            "id": str(uuid.uuid4()),
+            "user_id": customer_uuid(customer_id),
+            "items": [
+                {
+                    "product_id": line.product_id,
+                    "name": product["name"],
+                    "quantity": line.quantity,
+                    "price": line.unit_price / 100,
+                    "item_total": line.total / 100
+                }
+                for line, product in lines
+            ],
+            "total": cart.total,
+            "status": "pending",
+            "delivery_address": order_request.delivery_address,
+            "delivery_date": order_request.delivery_date.isoformat(),
+            "delivery_time": order_request.delivery_time,
+            "payment_status": "pending",
+            "created_at": now,
+            "updated_at": now
+        }
+        customer_orders[order["id"]] = order
+        customer_order_ids[customer_id] = customer_order_ids.get(customer_id, []) + [order["id"]]
+        del customer_carts[customer_uuid(customer_id)]
+        product_events.follow(customer_id, ())
+    
+    background_tasks.add_task(complete_order, order["id"], stock_levels)
+    return {"message": "Order placed successfully", "order": order}
+
+async def complete_order(order_id: str, stock_levels: dict):
+    """Post-checkout work: show new stock levels everywhere and confirm the order"""
+    publish_stock_levels(stock_levels)
+    
+    with storage.transaction():
+        order = customer_orders.get(order_id)
+        if order is None or order["status"] != "pending":
+            return
+        order["status"] = "confirmed"
+        order["updated_at"] = datetime.now(timezone.utc).isoformat()
+        customer_orders[order_id] = order
+    logger.info("Order %s confirmed for %s", order_id, order["user_id"])
+
+@app.get("/api/customer/orders")
+async def get_customer_orders(customer: dict = Depends(verify_customer_token)):
+    """List the customer's orders, newest first"""
+    order_ids = customer_order_ids.get(customer["id"], [])
+    orders = [customer_orders.get(order_id) for order_id in reversed(order_ids)]
+    return {"orders": [order for order in orders if order]}
+
+@app.get("/api/customer/orders/{order_id}")
+async def get_customer_order(order_id: str, customer: dict = Depends(verify_customer_token)):
+    """Get one of the customer's orders"""
+    order = customer_orders.get(order_id)
+    if not order or order["user_id"] != customer_uuid(customer["id"]):
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {"order": order}
 
 # Owner Authentication Endpoints
 @app.post("/api/owner/generate-key")
-async def generate_owner_key(request: OwnerKeyRequest):
+async def generate_owner_key(request: OwnerKeyRequest, http_request: Request):
     """Generate security key for authorized owner phone numbers"""
     phone_number = request.phone_number.strip()
+    enforce_rate_limits(http_request, f"phone:{phone_number}")
     
     # Check if phone number is authorized
-    if phone_number not in AUTHORIZED_OWNER_PHONES:
+    if phone_number not in owner_registry:
         raise HTTPException(
             status_code=403, 
             detail="Access denied: This phone number is not authorized for owner access"
@@ -396,34 +1178,27 @@ async def generate_owner_key(request: OwnerKeyRequest):
     }
 
 @app.post("/api/owner/login")
-async def owner_login(request: OwnerLoginRequest):
+async def owner_login(request: OwnerLoginRequest, http_request: Request):
     """Login as owner using phone number and security key"""
     phone_number = request.phone_number.strip()
     provided_key = request.security_key.strip().upper()
+    enforce_rate_limits(http_request, f"phone:{phone_number}")
     
     # Check if phone number is authorized
-    if phone_number not in AUTHORIZED_OWNER_PHONES:
+    if phone_number not in owner_registry:
         raise HTTPException(status_code=403, detail="Access denied: Not an authorized owner")
     
     # Verify security key
     expected_key = generate_security_key(phone_number)
-    if provided_key != expected_key:
+    if not secrets.compare_digest(provided_key.encode(), expected_key.encode()):
         raise HTTPException(status_code=401, detail="Invalid security key")
     
-    # Generate JWT token
+    # Generate JWT token and its session
     token_data = {
         "phone_number": phone_number,
-        "is_owner": True,
-        "exp": datetime.utcnow() + timedelta(hours=24)
-    }
-    
-    token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
-    
-    # Store session
-    owner_sessions[phone_number] = {
-        "token": token,
-        "login_time": datetime.now().isoformat()
+        "is_owner": True
     }
+    token = issue_token(token_data, owner_sessions, phone_number)
     
     return {
         "message": "Owner login successful",
@@ -432,6 +1207,20 @@ async def owner_login(request: OwnerLoginRequest):
         "is_owner": True
     }
 
+@app.post("/api/owner/logout")
+async def owner_logout(credentials: HTTPAuthorizationCredentials = Depends(security), owner_data: dict = Depends(verify_owner_token)):
+    """Owner logout: end the session of the token used for this request"""
+    owner_sessions.revoke(credentials.credentials)
+    return {"message": "Logged out successfully"}
+
+@app.get("/api/owner/sessions")
+async def get_session_counts(owner_data: dict = Depends(verify_owner_token)):
+    """Live session counts, for capacity planning"""
+    return {
+        "customer_sessions": len(customer_sessions),
+        "owner_sessions": len(owner_sessions)
+    }
+
 @app.get("/api/owner/verify")
 async def verify_owner_status(owner_data: dict = Depends(verify_owner_token)):
     """Verify current owner status"""
@@ -444,58 +1233,143 @@ async def verify_owner_status(owner_data: dict = Depends(verify_owner_token)):
 @app.post("/api/owner/upload-grocery-image")
 async def upload_grocery_image(product: ProductUpload, owner_data: dict = Depends(verify_owner_token)):
     """Upload grocery image (owner only)"""
+    try:
+        image_bytes = decode_image_data(product.image_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Store image bytes once, keyed by content hash
+    digest = await run_in_threadpool(blob_store.put, image_bytes)
+    thumbnails.submit(digest)
     
     # Create new product
     new_product = {
-        "id": f"owner_{len(uploaded_products) + 1}",
+        "id": f"owner_{storage.next_value('owner_product_id')}",
         "name": product.name,
         "category": product.category,
         "price": product.price,
         "description": product.description,
-        "image_url": product.image_data,  # base64 data URL
+        "image_url": f"{IMAGE_URL_PREFIX}{digest}",
         "owner_uploaded": True,
-        "uploaded_by": owner_data["phone_number"]
+        "uploaded_by": owner_data["phone_number"],
+        "stock": product.stock
     }
     
-    uploaded_products.append(new_product)
-    SAMPLE_PRODUCTS.append(new_product)
+    uploaded_products[new_product["id"]] = new_product
+    catalog.add(new_product)
+    publish_catalog_change([new_product["id"]])
     
     return {"message": "Product uploaded successfully", "product_id": new_product["id"]}
 
+def apply_import_batch(rows: List[dict], phone_number: str) -> List[str]:
+    """Store a batch of validated import rows as owner products; returns their ids"""
+    last_id = storage.next_value("owner_product_id", len(rows))
+    products = [
+        {
+            "id": f"owner_{last_id - len(rows) + 1 + i}",
+            **row,
+            "owner_uploaded": True,
+            "uploaded_by": phone_number
+        }
+        for i, row in enumerate(rows)
+    ]
+    with storage.transaction():
+        for product in products:
+            uploaded_products[product["id"]] = product
+    for product in products:
+        catalog.add(product)
+    return [product["id"] for product in products]
+
+@app.post("/api/owner/products/import")
+async def import_owner_products(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    owner_data: dict = Depends(verify_owner_token)
+):
+    """Bulk-import products from an NDJSON or CSV body (owner only)
+    
+    The format comes from the query string or the Content-Type header.
+    Valid rows are imported; the rest are listed in the error report.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    records = (iter_csv if format == "csv" else iter_ndjson)(request.stream())
+    
+    imported = []
+    errors = []
+    batch = []
+    try:
+        async for line_number, record, error in records:
+            if error is None:
+                try:
+                    batch.append(validate_product_row(record))
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                errors.append({"line": line_number, "error": error})
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported += apply_import_batch(batch, owner_data["phone_number"])
+                batch = []
+        if batch:
+            imported += apply_import_batch(batch, owner_data["phone_number"])
+    except ImportFormatError as e:
+        errors.append({"line": None, "error": str(e)})
+    finally:
+        if imported:
+            publish_catalog_change(imported)
+    
+    return {
+        "message": f"Imported {len(imported)} products",
+        "imported": len(imported),
+        "failed": len(errors),
+        "errors": errors
+    }
+
 @app.get("/api/owner/products")
 async def get_owner_products(owner_data: dict = Depends(verify_owner_token)):
     """Get products uploaded by current owner"""
-    owner_products = [p for p in uploaded_products if p.get("uploaded_by") == owner_data["phone_number"]]
-    return {"products": owner_products}
+    sync_catalog()
+    return {"products": catalog.by_owner(owner_data["phone_number"])}
 
 @app.delete("/api/owner/products/{product_id}")
 async def delete_owner_product(product_id: str, owner_data: dict = Depends(verify_owner_token)):
     """Delete owner's product"""
-    global uploaded_products, SAMPLE_PRODUCTS
+    sync_catalog()
     
     # Find product
-    product = next((p for p in uploaded_products if p["id"] == product_id), None)
-    if not product:
+    product = catalog.get(product_id)
+    if not product or not product.get("owner_uploaded"):
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Check ownership
     if product.get("uploaded_by") != owner_data["phone_number"]:
         raise HTTPException(status_code=403, detail="You can only delete your own products")
     
-    # Remove from both lists
-    uploaded_products = [p for p in uploaded_products if p["id"] != product_id]
-    SAMPLE_PRODUCTS[:] = [p for p in SAMPLE_PRODUCTS if p["id"] != product_id]
+    # Remove from storage, catalog and its indexes
+    uploaded_products.pop(product_id, None)
+    catalog.remove(product_id)
+    publish_catalog_change([product_id])
     
     return {"message": "Product deleted successfully"}
 
 # Regular user endpoints (for customers)
 @app.post("/api/users")
 async def create_user(user: UserModel):
-    user_id = f"user_{len(users_store) + 1}"
-    users_store[user_id] = user.dict()
-    users_store[user_id]["id"] = user_id
+    user_id = f"user_{storage.next_value('user_id')}"
+    users_store[user_id] = {**user.dict(), "id": user_id}
     return {"user_id": user_id, "message": "User created successfully"}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Worker processes share carts, sessions and catalog through DATABASE_URL,
+        # defaulting to a SQLite database in WAL mode next to this file
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(backend_dir, 'store.db')}")
+        if not open_storage(os.environ["DATABASE_URL"]).shared:
+            raise SystemExit("WEB_CONCURRENCY > 1 requires a shared DATABASE_URL (sqlite:// or postgresql://)")
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=workers, app_dir=backend_dir)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
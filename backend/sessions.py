@@ -0,0 +1,102 @@
+"""
+Login sessions for QUALITY Store
+
+Every issued bearer token has a session, keyed by the token's digest, that
+expires with the token. A token is only accepted while its session exists,
+so logging out (revoking the session) invalidates the token even though the
+JWT itself is still signed and unexpired.
+
+Expired sessions are removed by a sweeper driven by a min-heap of expiry
+times: each sweep pops only what has expired, so it costs O(log n) per
+removed session no matter how many are live. The total number of sessions
+is capped; past the cap, the sessions closest to expiry are dropped first.
+Revoked sessions leave their heap entries behind until a sweep reaches them,
+so the heap is rebuilt once those stale entries outnumber the live ones.
+
+Whoever caches verified tokens passes on_end, which is called with the
+session key (the token digest) whenever a session ends for any reason.
+"""
+
+import heapq
+import time
+from datetime import datetime
+
+from cache import TokenCache
+
+
+class SessionStore:
+    """Expiring sessions for bearer tokens, kept in a repository"""
+
+    def __init__(self, storage, name, ttl=24 * 3600, max_sessions=100000, on_end=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.on_end = on_end
+        self._sessions = storage.repository(name)
+        self._rebuild_expiry()
+
+    def __len__(self):
+        """Number of live sessions"""
+        self.sweep()
+        return len(self._sessions)
+
+    def create(self, token, subject, expires_at=None):
+        """Start a session for token on behalf of subject; returns the session"""
+        now = time.time()
+        session = {
+            "subject": subject,
+            "login_time": datetime.now().isoformat(),
+            "expires_at": expires_at if expires_at is not None else now + self.ttl,
+        }
+        key = TokenCache.digest(token)
+        self._sessions[key] = session
+        heapq.heappush(self._expiry, (session["expires_at"], key))
+        self.sweep(now)
+        self._enforce_limit()
+        return session
+
+    def get(self, token):
+        """Return the live session for token, or None"""
+        session = self._sessions.get(TokenCache.digest(token))
+        if session is None or session.get("expires_at", 0) <= time.time():
+            return None
+        return session
+
+    def revoke(self, token):
+        """End the session for token; returns False if there was none"""
+        key = TokenCache.digest(token)
+        if not self._end(key):
+            return False
+        self._revoked += 1
+        if self._revoked > len(self._expiry) // 2:
+            self._rebuild_expiry()
+        return True
+
+    def sweep(self, now=None):
+        """Remove expired sessions and return how many were removed"""
+        now = time.time() if now is None else now
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key = heapq.heappop(self._expiry)
+            if self._end(key):
+                removed += 1
+        return removed
+
+    def _enforce_limit(self):
+        excess = len(self._sessions) - self.max_sessions
+        while excess > 0 and self._expiry:
+            _, key = heapq.heappop(self._expiry)
+            if self._end(key):
+                excess -= 1
+
+    def _end(self, key):
+        # Notify even if another worker already removed the session
+        if self.on_end is not None:
+            self.on_end(key)
+        return self._sessions.pop(key, None) is not None
+
+    def _rebuild_expiry(self):
+        # (expires_at, key) for every session this process knows about.
+        # Sessions persisted without an expiry are swept on the first pass.
+        self._expiry = [(session.get("expires_at", 0), key) for key, session in self._sessions.items()]
+        heapq.heapify(self._expiry)
+        self._revoked = 0
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+QUALITY Store Backend Load Testing
+Drives the API with concurrent virtual users running a realistic request mix
+and reports latency percentiles and throughput per scenario.
+
+Targets:
+  inprocess  the ASGI app in this process (no network, isolates app cost)
+  uvicorn    a local uvicorn started by this script (--workers for multi-worker)
+  <url>      any running server, e.g. http://localhost:8001
+
+Results can be saved as a baseline; later runs compare against it and exit
+non-zero when p95 latency or throughput regresses beyond --threshold, or
+when there is no baseline for the run's target, mix and concurrency (record
+one first with --save-baseline).
+
+Requires httpx.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "load_baseline.json")
+
+# Rate limits would otherwise reject most logins from a single load generator
+LOAD_TEST_ENV = {
+    "AUTH_IP_BURST": "1000000",
+    "AUTH_IP_RATE_PER_MINUTE": "100000000",
+    "AUTH_IDENTITY_BURST": "1000000",
+    "AUTH_IDENTITY_RATE_PER_MINUTE": "100000000",
+}
+
+SEARCH_TERMS = ["fresh", "organic", "milk", "bread", "chick", "rice", "juice", "ban", "app", "chees"]
+CATEGORIES = ["fruits", "vegetables", "dairy", "meat", "bakery", "beverages", "snacks", "pantry"]
+
+# Scenario weights for each request mix
+MIXES = {
+    "mixed": {"browse": 40, "search": 25, "cart_read": 15, "cart_add": 15, "login": 5},
+    "browse": {"browse": 1},
+    "search": {"search": 1},
+    "cart": {"cart_read": 1, "cart_add": 1},
+    "login": {"login": 1},
+}
+
+PASSWORD = "load-test-password"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class VirtualUser:
+    """One simulated shopper with its own account and cart"""
+
+    def __init__(self, client, index, product_ids):
+        self.client = client
+        self.email = f"load-user-{index}@example.com"
+        self.product_ids = product_ids
+        self.headers = {}
+
+    async def setup(self):
+        await self.client.post("/api/customer/register", json={
+            "name": "Load User", "email": self.email, "password": PASSWORD, "phone": "0"
+        })
+        await self.login()
+
+    async def login(self):
+        response = await self.client.post("/api/customer/login", json={"email": self.email, "password": PASSWORD})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        return response
+
+    async def browse(self):
+        choice = random.random()
+        if choice < 0.5:
+            return await self.client.get("/api/products", params={"limit": 50})
+        if choice < 0.8:
+            return await self.client.get("/api/products", params={"category": random.choice(CATEGORIES)})
+        return await self.client.get(f"/api/products/{random.choice(self.product_ids)}")
+
+    async def search(self):
+        return await self.client.get("/api/products", params={"search": random.choice(SEARCH_TERMS), "limit": 20})
+
+    async def cart_read(self):
+        return await self.client.get("/api/customer/cart", headers=self.headers)
+
+    async def cart_add(self):
+        product_id = random.choice(self.product_ids)
+        response = await self.client.post("/api/customer/cart/add", headers=self.headers,
+                                          json={"product_id": product_id, "quantity": 1})
+        # Give the reservation back so stock does not run out mid-run (untimed)
+        if response.status_code == 200:
+            await self.client.delete(f"/api/customer/cart/{product_id}", headers=self.headers)
+        return response
+
+
+class LoadTester:
+    def __init__(self, args):
+        self.args = args
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, scenario, latency, ok):
+        self.samples.setdefault(scenario, []).append(latency)
+        if not ok:
+            self.errors[scenario] = self.errors.get(scenario, 0) + 1
+
+    async def run_user(self, user, weights, deadline):
+        scenarios, scenario_weights = list(weights), list(weights.values())
+        while time.perf_counter() < deadline:
+            scenario = random.choices(scenarios, weights=scenario_weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await getattr(user, scenario)()
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            self.record(scenario, time.perf_counter() - start, ok)
+
+    async def run(self, client):
+        products = (await client.get("/api/products")).json()["products"]
+        product_ids = [product["id"] for product in products]
+        users = [VirtualUser(client, i, product_ids) for i in range(self.args.concurrency)]
+        await asyncio.gather(*(user.setup() for user in users))
+
+        weights = MIXES[self.args.mix]
+        if self.args.warmup:
+            await asyncio.gather(*(self.run_user(user, weights, time.perf_counter() + self.args.warmup) for user in users))
+            self.samples, self.errors = {}, {}
+
+        start = time.perf_counter()
+        await asyncio.gather(*(self.run_user(user, weights, start + self.args.duration) for user in users))
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        results = {}
+        all_latencies = []
+        for scenario, latencies in sorted(self.samples.items()):
+            all_latencies.extend(latencies)
+            results[scenario] = self.summarize(latencies, elapsed, self.errors.get(scenario, 0))
+        results["total"] = self.summarize(all_latencies, elapsed, sum(self.errors.values()))
+
+        print(f"{'scenario':<12}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for scenario, result in results.items():
+            print(f"{scenario:<12}{result['requests']:>10}{result['errors']:>8}{result['throughput']:>10.1f}"
+                  f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+        return results
+
+    @staticmethod
+    def summarize(latencies, elapsed, errors):
+        latencies = sorted(latencies)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+
+
+def baseline_key(args):
+    target = args.target if args.target in ("inprocess", "uvicorn") else "url"
+    workers = f"-w{args.workers}" if args.target == "uvicorn" else ""
+    return f"{target}{workers}/{args.mix}/c{args.concurrency}"
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """Return a list of regressions of results against a saved baseline"""
+    regressions = []
+    for scenario, expected in baseline.items():
+        actual = results.get(scenario)
+        if actual is None:
+            continue
+        if actual["p95_ms"] > expected["p95_ms"] * (1 + threshold):
+            regressions.append(f"{scenario}: p95 {actual['p95_ms']:.2f}ms vs baseline {expected['p95_ms']:.2f}ms")
+        if actual["throughput"] < expected["throughput"] * (1 - threshold):
+            regressions.append(f"{scenario}: {actual['throughput']:.1f} rps vs baseline {expected['throughput']:.1f} rps")
+    return regressions
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_healthy(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+async def run_load_test(args):
+    tester = LoadTester(args)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    server_process = None
+
+    if args.target == "inprocess":
+        os.environ.update(LOAD_TEST_ENV)
+        sys.path.insert(0, BACKEND_DIR)
+        import server
+        transport = httpx.ASGITransport(app=server.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=30)
+    else:
+        if args.target == "uvicorn":
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            command = [sys.executable, "-m", "uvicorn", "server:app", "--app-dir", BACKEND_DIR,
+                       "--port", str(port), "--log-level", "warning", "--workers", str(args.workers)]
+            env = {**os.environ, **LOAD_TEST_ENV}
+            if args.workers > 1:
+                env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(BACKEND_DIR, 'loadtest.db')}")
+            server_process = subprocess.Popen(command, env=env)
+        else:
+            base_url = args.target.rstrip("/")
+        await wait_until_healthy(base_url)
+        client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30)
+
+    try:
+        async with client:
+            elapsed = await tester.run(client)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+    return tester.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QUALITY Store API load test")
+    parser.add_argument("--target", default="inprocess", help="inprocess, uvicorn or a server URL")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (uvicorn target)")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before measuring")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"QUALITY Store Load Test - {baseline_key(args)}, {args.duration:g}s")
+    print("=" * 70)
+    results = asyncio.run(run_load_test(args))
+
+    key = baseline_key(args)
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines[key] = results
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"\n💾 Saved baseline {key} to {args.baseline}")
+        return True
+
+    if key not in baselines:
+        print(f"\n❌ No baseline for {key} in {args.baseline}; run with --save-baseline to record one")
+        return False
+
+    regressions = compare_with_baseline(results, baselines[key], args.threshold)
+    if regressions:
+        print(f"\n❌ Regressions beyond {args.threshold:.0%} of baseline:")
+        for regression in regressions:
+            print(f"   • {regression}")
+        return False
+    print(f"\n✅ Within {args.threshold:.0%} of baseline {key}")
+    return True
+
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+QUALITY Store Backend Microbenchmarks
+Times the server.py hot paths directly (no HTTP) against synthetic catalogs
+and customer bases of increasing size:
+
+  products_all        list_products, first page of the whole catalog
+  products_category   list_products filtered by category
+  products_search     list_products with a search query
+  get_cart            load_cart + cart_response for a 20-line cart
+  verify_token        customer token verification (token cache hit)
+  verify_token_cold   customer token verification (cache miss: JWT decode + session)
+  security_key        generate_security_key for an owner
+  customer_lookup     the email -> customer lookup done by customer_login
+
+Each result is the median time per call over several timed rounds. Results
+can be saved as a JSON baseline; later runs compare against it and exit
+non-zero when any benchmark is slower than the baseline by more than
+--threshold, or has no baseline to compare against (record one first with
+--save-baseline).
+
+The 1M scale needs about 3 GB of memory and half a minute of setup; pass
+--scales to run a subset.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "micro_baseline.json")
+DEFAULT_SCALES = "1000,100000,1000000"
+
+WORDS = ["fresh", "organic", "green", "sweet", "crunchy", "whole", "farm", "golden", "classic", "spicy",
+         "apple", "banana", "milk", "bread", "rice", "cheese", "juice", "tomato", "chicken", "pasta"]
+CART_LINES = 20
+
+# Benchmark the code paths themselves, on the in-memory storage backend
+os.environ.pop("DATABASE_URL", None)
+sys.path.insert(0, BACKEND_DIR)
+import server  # noqa: E402
+from catalog import ProductCatalog  # noqa: E402
+from cart import Cart, to_cents  # noqa: E402
+
+
+def synthetic_product(i, rng):
+    return {
+        "id": f"bench_{i}",
+        "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}",
+        "category": server.CATEGORIES[i % len(server.CATEGORIES)],
+        "price": round(rng.uniform(0.5, 50), 2),
+        "description": " ".join(rng.choices(WORDS, k=8)),
+        "image_url": "",
+        "owner_uploaded": False,
+        "stock": 100,
+    }
+
+
+def populate(scale):
+    """Replace the server's catalog and customers with synthetic data
+
+    Returns a customer with a full cart and a valid token for them.
+    """
+    rng = random.Random(scale)
+    server.catalog = ProductCatalog(synthetic_product(i, rng) for i in range(scale))
+    server.response_cache.clear()
+    server.customer_token_cache.clear()
+
+    server.customer_users.clear()
+    server.customer_emails.clear()
+    for i in range(scale):
+        customer_id = f"customer_{i}"
+        # Password hashes are never checked here, so a placeholder will do
+        server.customer_users[customer_id] = {
+            "id": customer_id, "name": f"Customer {i}", "email": f"customer{i}@example.com",
+            "password": "", "phone": "0", "created_at": "2024-01-01T00:00:00"
+        }
+        server.customer_emails[f"customer{i}@example.com"] = customer_id
+
+    customer = server.customer_users[f"customer_{scale // 2}"]
+    cart = Cart()
+    for product_id in rng.sample(range(scale), min(CART_LINES, scale)):
+        product = server.catalog.get(f"bench_{product_id}")
+        cart.add(product["id"], 1, to_cents(product["price"]))
+    server.customer_carts[customer["id"]] = cart
+
+    token = server.issue_token({"customer_id": customer["id"], "email": customer["email"], "is_customer": True},
+                               server.customer_sessions, customer["id"])
+    return customer, token
+
+
+def benchmarks(customer, token):
+    owner_phone = next(iter(server.AUTHORIZED_OWNER_PHONES))
+    email = f"  {customer['email'].upper()} "
+
+    def customer_lookup():
+        customer_id = server.customer_emails.get(server.normalize_email(email))
+        return server.customer_users.get(customer_id)
+
+    def verify_token_cold():
+        server.customer_token_cache.invalidate(token)
+        return server.customer_from_token(token)
+
+    return {
+        "products_all": lambda: server.list_products(None, None, 50, None, None, None),
+        "products_category": lambda: server.list_products(None, "dairy", 50, None, None, None),
+        "products_search": lambda: server.list_products("fresh app", None, 50, None, None, None),
+        "get_cart": lambda: server.cart_response(server.load_cart(customer["id"])),
+        "verify_token": lambda: server.customer_from_token(token),
+        "verify_token_cold": verify_token_cold,
+        "security_key": lambda: server.generate_security_key(owner_phone),
+        "customer_lookup": customer_lookup,
+    }
+
+
+def time_per_call(function, rounds, min_round_time=0.05):
+    """Median seconds per call over rounds, each at least min_round_time long"""
+    function()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+        calls *= 2
+    samples = [elapsed / calls]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        samples.append((time.perf_counter() - start) / calls)
+    return statistics.median(samples)
+
+
+def format_time(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} µs"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QUALITY Store hot path microbenchmarks")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="comma-separated catalog/customer sizes")
+    parser.add_argument("--only", help="comma-separated benchmark names to run")
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds per benchmark")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    regressions = []
+    missing = []
+    print("=" * 70)
+    print("QUALITY Store Microbenchmarks")
+    print("=" * 70)
+    for scale in (int(s) for s in args.scales.split(",")):
+        start = time.perf_counter()
+        customer, token = populate(scale)
+        print(f"\nScale {scale:,} (setup {time.perf_counter() - start:.1f}s)")
+        results[str(scale)] = {}
+        for name, function in benchmarks(customer, token).items():
+            if only and name not in only:
+                continue
+            seconds = time_per_call(function, args.rounds)
+            results[str(scale)][name] = seconds
+            line = f"   {name:<20}{format_time(seconds):>14}"
+            expected = baselines.get(str(scale), {}).get(name)
+            if expected is None:
+                missing.append(f"{name} @ {scale:,}")
+            else:
+                change = seconds / expected - 1
+                line += f"   {change:+.0%} vs baseline"
+                if change > args.threshold:
+                    line += "  ❌"
+                    regressions.append(f"{name} @ {scale:,}: {format_time(seconds)} vs baseline {format_time(expected)}")
+            print(line)
+
+    if args.save_baseline:
+        for scale, timings in results.items():
+            baselines.setdefault(scale, {}).update(timings)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"\n💾 Saved baseline to {args.baseline}")
+        return True
+
+    if missing:
+        print(f"\n❌ No baseline in {args.baseline} for:")
+        for benchmark in missing:
+            print(f"   • {benchmark}")
+        print("   Run with --save-baseline to record one")
+    if regressions:
+        print(f"\n❌ Slower than baseline by more than {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"   • {regression}")
+    if missing or regressions:
+        return False
+    print("\n✅ No regressions")
+    return True
+
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
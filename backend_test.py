@@ -12,6 +12,9 @@ from datetime import datetime
 import time
 import base64
 import io
+import sys
+import tempfile
+import threading
 
 # Get backend URL from environment
 import os
@@ -21,6 +24,14 @@ from dotenv import load_dotenv
 load_dotenv('/app/frontend/.env')
 BACKEND_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001') + '/api'
 
+# Stock and import tests drive the backend modules in-process, since a live
+# server's reservation expiry cannot be controlled from outside
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+
+# Optional Postgres database for the storage locking test, e.g.
+# postgresql://postgres@localhost:5432/quality_store_test (SQLite otherwise)
+POSTGRES_TEST_URL = os.environ.get('POSTGRES_TEST_URL')
+
 class QualityStoreAPITester:
     def __init__(self):
         self.base_url = BACKEND_URL
@@ -29,6 +40,7 @@ class QualityStoreAPITester:
         self.test_order_id = None
         self.test_session_id = None
         self.uploaded_product_id = None
+        self.backend = None
         self.results = {
             "passed": 0,
             "failed": 0,
@@ -703,6 +715,628 @@ class QualityStoreAPITester:
             self.log_result("Error Handling", False, f"Exception: {str(e)}")
         return False
     
+    def in_process_backend(self):
+        """Import the backend on in-memory storage and return (server module, test client)"""
+        if self.backend is None:
+            os.environ.pop("DATABASE_URL", None)
+            os.environ.setdefault("BLOB_STORE_DIR", tempfile.mkdtemp(prefix="quality-store-blobs-"))
+            if BACKEND_DIR not in sys.path:
+                sys.path.insert(0, BACKEND_DIR)
+            import server
+            from fastapi.testclient import TestClient
+            self.backend = (server, TestClient(server.app))
+        return self.backend
+    
+    def in_process_customer(self, client):
+        """Register and log in a fresh customer; return (customer id, auth headers)"""
+        email = f"stock.{uuid.uuid4().hex[:8]}@qualitystore.com"
+        client.post("/api/customer/register", json={
+            "name": "Stock Tester", "email": email, "password": "stock-test-password", "phone": "+1-555-0123"
+        })
+        response = client.post("/api/customer/login", json={"email": email, "password": "stock-test-password"})
+        data = response.json()
+        return data["customer"]["id"], {"Authorization": f"Bearer {data['token']}"}
+    
+    def test_stock_reservations(self):
+        """Test stock ledger reservations: reserve, release and expiry"""
+        try:
+            sys.path.insert(0, BACKEND_DIR)
+            from inventory import InsufficientStock, StockLedger
+            from storage import open_storage
+            
+            ledger = StockLedger(open_storage(None), ttl=0.5)
+            ledger.reserve("sku", "alice", 3, 5)
+            if ledger.available("sku", 5) != 2 or ledger.available("sku", 5, holder="alice") != 5:
+                self.log_result("Stock Reserve", False, f"Available after reserving 3 of 5: {ledger.available('sku', 5)}")
+                return False
+            try:
+                ledger.reserve("sku", "bob", 3, 5)
+                self.log_result("Stock Reserve", False, "Reserved 3 more units with only 2 available")
+                return False
+            except InsufficientStock as e:
+                if e.available != 2:
+                    self.log_result("Stock Reserve", False, f"Expected 2 available, got {e.available}")
+                    return False
+            self.log_result("Stock Reserve", True, "Reservations hold units back from other customers")
+            
+            ledger.release("sku", "alice")
+            if ledger.available("sku", 5) != 5 or ledger.reserved("sku", "alice") != 0:
+                self.log_result("Stock Release", False, f"Available after release: {ledger.available('sku', 5)}")
+                return False
+            self.log_result("Stock Release", True, "Released units are available again")
+            
+            ledger.reserve("sku", "alice", 4, 5)
+            time.sleep(0.6)
+            if ledger.available("sku", 5) != 5 or ledger.reserved("sku", "alice") != 0:
+                self.log_result("Stock Reservation Expiry", False, f"Available after expiry: {ledger.available('sku', 5)}")
+                return False
+            self.log_result("Stock Reservation Expiry", True, "Expired reservations no longer hold stock")
+            
+            try:
+                ledger.reserve("sku", "alice", -1, 5)
+                self.log_result("Negative Reservation", False, "Negative quantity was accepted")
+            except ValueError:
+                self.log_result("Negative Reservation", True, "Negative quantity rejected")
+                return True
+        except Exception as e:
+            self.log_result("Stock Reservations", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_concurrent_last_unit_reservation(self):
+        """Test that only one of many concurrent customers gets the last unit"""
+        try:
+            sys.path.insert(0, BACKEND_DIR)
+            from inventory import InsufficientStock, StockLedger
+            from storage import open_storage
+            
+            with tempfile.TemporaryDirectory() as directory:
+                # SQLite, so every thread reserves through its own connection as workers would
+                storage = open_storage(f"sqlite:///{os.path.join(directory, 'ledger.db')}", pool_size=8)
+                ledger = StockLedger(storage)
+                start = threading.Barrier(8)
+                winners, losers = [], []
+                
+                def reserve(holder):
+                    start.wait()
+                    try:
+                        ledger.reserve("last_unit", holder, 1, 1)
+                        winners.append(holder)
+                    except InsufficientStock:
+                        losers.append(holder)
+                
+                threads = [threading.Thread(target=reserve, args=(f"customer_{i}",)) for i in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                storage.close()
+            
+            if len(winners) == 1 and len(losers) == 7:
+                self.log_result("Concurrent Last Unit", True, f"Only {winners[0]} reserved the last unit")
+                return True
+            self.log_result("Concurrent Last Unit", False, f"{len(winners)} reservations succeeded, {len(losers)} refused")
+        except Exception as e:
+            self.log_result("Concurrent Last Unit", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_multi_sku_lock_order(self):
+        """Test that transactions touching the same SKUs in opposite orders do not deadlock"""
+        try:
+            sys.path.insert(0, BACKEND_DIR)
+            from inventory import StockLedger
+            from storage import open_storage
+            
+            with tempfile.TemporaryDirectory() as directory:
+                url = POSTGRES_TEST_URL or f"sqlite:///{os.path.join(directory, 'ledger.db')}"
+                storage = open_storage(url, pool_size=8)
+                ledger = StockLedger(storage)
+                skus = [f"lock_{uuid.uuid4().hex[:8]}", f"lock_{uuid.uuid4().hex[:8]}"]
+                start = threading.Barrier(8)
+                failures = []
+                
+                def shop(holder, order):
+                    start.wait()
+                    for _ in range(25):
+                        try:
+                            # Like checkout: one transaction reserving every line of a cart
+                            with storage.transaction():
+                                ledger.lock(order)
+                                for sku in order:
+                                    ledger.reserve(sku, holder, 1, 1000)
+                            with storage.transaction():
+                                ledger.lock(order)
+                                for sku in order:
+                                    ledger.release(sku, holder)
+                        except Exception as e:
+                            failures.append(f"{type(e).__name__}: {e}")
+                
+                threads = [
+                    threading.Thread(target=shop, args=(f"customer_{i}", skus if i % 2 else skus[::-1]))
+                    for i in range(8)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                storage.close()
+            
+            backend_name = "Postgres" if POSTGRES_TEST_URL else "SQLite"
+            if not failures:
+                self.log_result("Multi-SKU Lock Order", True, f"400 opposite-order transactions on {backend_name} without deadlocks")
+                return True
+            self.log_result("Multi-SKU Lock Order", False, f"{len(failures)} failures on {backend_name}, first: {failures[0]}")
+        except Exception as e:
+            self.log_result("Multi-SKU Lock Order", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_checkout_stock(self):
+        """Test that checkout commits reserved stock and refuses lines that lost it"""
+        try:
+            server, client = self.in_process_backend()
+            customer_id, headers = self.in_process_customer(client)
+            checkout_data = {
+                "delivery_address": "123 Grocery Lane, Fresh City, FC 12345",
+                "delivery_date": "2025-01-20",
+                "delivery_time": "10:00 AM - 12:00 PM"
+            }
+            
+            stock_before = client.get("/api/products/1").json()["stock"]
+            client.post("/api/customer/cart/add", headers=headers, json={"product_id": "1", "quantity": 2})
+            response = client.post("/api/customer/checkout", headers=headers, json=checkout_data)
+            if response.status_code != 200:
+                self.log_result("Checkout Commit", False, f"Status code: {response.status_code}", response.text)
+                return False
+            stock_after = client.get("/api/products/1").json()["stock"]
+            if stock_after != stock_before - 2:
+                self.log_result("Checkout Commit", False, f"Stock went from {stock_before} to {stock_after}")
+                return False
+            self.log_result("Checkout Commit", True, f"Stock went from {stock_before} to {stock_after}")
+            
+            # Let the reservation lapse and have another customer take the remaining units
+            client.post("/api/customer/cart/add", headers=headers, json={"product_id": "2", "quantity": 2})
+            server.stock_ledger.release("2", customer_id)
+            product = server.catalog.get("2")
+            available = server.stock_ledger.available("2", product["stock"])
+            server.stock_ledger.reserve("2", "other_customer", available, product["stock"])
+            try:
+                response = client.post("/api/customer/checkout", headers=headers, json=checkout_data)
+                cart = client.get("/api/customer/cart", headers=headers).json()
+            finally:
+                server.stock_ledger.release("2", "other_customer")
+            if response.status_code != 409:
+                self.log_result("Checkout Conflict", False, f"Expected 409, got {response.status_code}", response.text)
+                return False
+            errors = response.json()["detail"]["errors"]
+            if [error["product_id"] for error in errors] != ["2"] or not cart.get("cart"):
+                self.log_result("Checkout Conflict", False, f"Unexpected errors or cart: {errors}, {cart}")
+                return False
+            self.log_result("Checkout Conflict", True, "Checkout refused with 409 and the cart was kept")
+            
+            response = client.put("/api/customer/cart/2", headers=headers, json={"product_id": "2", "quantity": -1})
+            if response.status_code == 422:
+                self.log_result("Negative Cart Quantity", True, "Negative quantity rejected")
+                return True
+            self.log_result("Negative Cart Quantity", False, f"Expected 422, got {response.status_code}")
+        except Exception as e:
+            self.log_result("Checkout Stock", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_product_import_report(self):
+        """Test that bulk import keeps valid rows and reports the others by line"""
+        try:
+            server, client = self.in_process_backend()
+            phone_number = next(iter(server.AUTHORIZED_OWNER_PHONES))
+            key = client.post("/api/owner/generate-key", json={"phone_number": phone_number}).json()["security_key"]
+            token = client.post("/api/owner/login", json={"phone_number": phone_number, "security_key": key}).json()["token"]
+            headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"}
+            
+            body = "\n".join([
+                json.dumps({"name": "Import Apples", "category": "fruits", "price": 3.5, "stock": 10}),
+                "{not json",
+                json.dumps({"category": "fruits", "price": 1}),
+                "",
+                '{"name": "Huge Price", "category": "fruits", "price": 1e400}',
+                json.dumps({"name": "Negative Stock", "category": "fruits", "price": 1, "stock": -2}),
+                json.dumps({"name": "Import Pears", "category": "fruits", "price": "2.25"}),
+            ])
+            response = client.post("/api/owner/products/import", headers=headers, content=body)
+            if response.status_code != 200:
+                self.log_result("Product Import Report", False, f"Status code: {response.status_code}", response.text)
+                return False
+            report = response.json()
+            failed_lines = [error["line"] for error in report["errors"]]
+            
+            # Remove what was imported so reruns start from the same catalog
+            for product in client.get("/api/owner/products", headers=headers).json()["products"]:
+                if product["name"] in ("Import Apples", "Import Pears"):
+                    client.delete(f"/api/owner/products/{product['id']}", headers=headers)
+            
+            if report["imported"] == 2 and failed_lines == [2, 3, 5, 6]:
+                self.log_result("Product Import Report", True, f"Imported 2 rows, reported lines {failed_lines}")
+                return True
+            self.log_result("Product Import Report", False, f"Unexpected report: {report}")
+        except Exception as e:
+            self.log_result("Product Import Report", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_csv_import_with_bom(self):
+        """Test that a CSV saved with a UTF-8 byte order mark imports cleanly"""
+        try:
+            server, client = self.in_process_backend()
+            phone_number = next(iter(server.AUTHORIZED_OWNER_PHONES))
+            key = client.post("/api/owner/generate-key", json={"phone_number": phone_number}).json()["security_key"]
+            token = client.post("/api/owner/login", json={"phone_number": phone_number, "security_key": key}).json()["token"]
+            headers = {"Authorization": f"Bearer {token}", "Content-Type": "text/csv"}
+            
+            body = "\ufeffname,category,price,stock\r\nBOM Plums,fruits,4.25,12\r\n".encode("utf-8")
+            response = client.post("/api/owner/products/import", headers=headers, content=body)
+            report = response.json()
+            
+            for product in client.get("/api/owner/products", headers=headers).json()["products"]:
+                if product["name"] == "BOM Plums":
+                    client.delete(f"/api/owner/products/{product['id']}", headers=headers)
+            
+            if response.status_code == 200 and report["imported"] == 1 and not report["errors"]:
+                self.log_result("CSV Import With BOM", True, "Header with byte order mark recognised")
+                return True
+            self.log_result("CSV Import With BOM", False, f"Status {response.status_code}, report: {report}")
+        except Exception as e:
+            self.log_result("CSV Import With BOM", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_search_ranking(self):
+        """Test search ranking and tokenizing on the product catalog"""
+        try:
+            sys.path.insert(0, BACKEND_DIR)
+            from catalog import ProductCatalog
+            
+            catalog = ProductCatalog([
+                {"id": "1", "name": "Basil Pesto", "category": "spices", "price": 1, "description": "Small jar"},
+                {"id": "2", "name": "Pasta Sauce", "category": "grains", "price": 1, "description": "Tomato sauce with basil"},
+                {"id": "3", "name": "Pea Soup", "category": "pulses", "price": 1, "description": "Hearty"},
+                {"id": "4", "name": "Peanut Butter", "category": "snacks", "price": 1, "description": "Crunchy"},
+                {"id": "5", "name": "Crème Brûlée", "category": "dairy", "price": 1, "description": "Ready-to-eat dessert"},
+                {"id": "6", "name": "抹茶ラテ", "category": "beverages", "price": 1, "description": "Matcha latte"},
+            ])
+            
+            def ids(query, category=None):
+                return [product["id"] for product in catalog.search(query, category)]
+            
+            checks = [
+                ("name hits rank above description hits", ids("basil"), ["1", "2"]),
+                ("exact hits rank above prefix hits", ids("pea"), ["3", "4"]),
+                ("every term must match", ids("basil sauce"), ["2"]),
+                ("typeahead prefixes match", ids("bas"), ["1", "2"]),
+                ("category filter applies", ids("pea", "snacks"), ["4"]),
+                ("matching ignores case", ids("CRÈME"), ["5"]),
+                ("punctuation splits words", ids("eat"), ["5"]),
+                ("CJK text matches by bigram", ids("抹茶"), ["6"]),
+                ("no match gives no results", ids("durian"), []),
+            ]
+            failed = [f"{name}: got {got}, expected {expected}" for name, got, expected in checks if got != expected]
+            if not failed:
+                self.log_result("Search Ranking", True, f"{len(checks)} ranking and tokenizing checks passed")
+                return True
+            self.log_result("Search Ranking", False, "; ".join(failed))
+        except Exception as e:
+            self.log_result("Search Ranking", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_product_etags(self):
+        """Test ETag revalidation of cached product listings"""
+        try:
+            server, client = self.in_process_backend()
+            url = "/api/products?category=dairy"
+            
+            first = client.get(url)
+            etag = first.headers.get("ETag")
+            if first.status_code != 200 or not etag:
+                self.log_result("Product ETags", False, f"Status {first.status_code}, ETag {etag}")
+                return False
+            
+            not_modified = client.get(url, headers={"If-None-Match": etag})
+            weak = client.get(url, headers={"If-None-Match": f'"other", W/{etag}'})
+            if not_modified.status_code != 304 or not_modified.content or weak.status_code != 304:
+                self.log_result("Product ETags", False, f"Revalidation gave {not_modified.status_code} and {weak.status_code}")
+                return False
+            
+            # Equivalent field lists and image widths share one cached response
+            projected = client.get(url + "&fields=price,name").headers.get("ETag")
+            reordered = client.get(url + "&fields=name,price,name,unknown").headers.get("ETag")
+            sized = client.get(url + "&image_width=151").headers.get("ETag")
+            snapped = client.get(url + "&image_width=300").headers.get("ETag")
+            if projected != reordered or sized != snapped:
+                self.log_result("Product ETags", False, "Equivalent requests got different ETags")
+                return False
+            
+            # A stock change to a listed product must change the ETag
+            product = server.catalog.get("14")
+            server.catalog.set_stock("14", product["stock"] + 1)
+            try:
+                changed = client.get(url, headers={"If-None-Match": etag})
+            finally:
+                server.catalog.set_stock("14", product["stock"])
+            if changed.status_code != 200 or changed.headers.get("ETag") == etag:
+                self.log_result("Product ETags", False, f"Stale ETag still matched after a stock change: {changed.status_code}")
+                return False
+            
+            self.log_result("Product ETags", True, "304 for matching ETags, new ETag after a stock change")
+            return True
+        except Exception as e:
+            self.log_result("Product ETags", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_cart_batch_atomicity(self):
+        """Test that a cart batch with any invalid operation changes nothing"""
+        try:
+            server, client = self.in_process_backend()
+            customer_id, headers = self.in_process_customer(client)
+            
+            applied = client.post("/api/customer/cart/batch", headers=headers, json={"operations": [
+                {"op": "add", "product_id": "1", "quantity": 2},
+                {"op": "add", "product_id": "2", "quantity": 1},
+                {"op": "add", "product_id": "1", "quantity": 1},
+            ]})
+            if applied.status_code != 200:
+                self.log_result("Cart Batch Atomicity", False, f"Valid batch: status {applied.status_code}", applied.text)
+                return False
+            before = client.get("/api/customer/cart", headers=headers).json()
+            reserved_before = server.stock_ledger.reserved("2", customer_id)
+            
+            rejected = client.post("/api/customer/cart/batch", headers=headers, json={"operations": [
+                {"op": "remove", "product_id": "1"},
+                {"op": "set", "product_id": "2", "quantity": 5},
+                {"op": "add", "product_id": "3", "quantity": 1},
+                {"op": "set", "product_id": "4", "quantity": 1},
+                {"op": "add", "product_id": "5", "quantity": 100000},
+            ]})
+            after = client.get("/api/customer/cart", headers=headers).json()
+            reserved_after = server.stock_ledger.reserved("2", customer_id)
+            client.post("/api/customer/cart/batch", headers=headers, json={"operations": [
+                {"op": "remove", "product_id": "1"}, {"op": "remove", "product_id": "2"},
+            ]})
+            
+            errors = rejected.json().get("detail", {}).get("errors", []) if rejected.status_code == 400 else []
+            quantities = {item["product_id"]: item["quantity"] for item in before["cart"]}
+            if quantities != {"1": 3, "2": 1}:
+                self.log_result("Cart Batch Atomicity", False, f"Valid batch applied as {quantities}")
+                return False
+            if rejected.status_code != 400 or len(errors) != 2:
+                self.log_result("Cart Batch Atomicity", False, f"Invalid batch: status {rejected.status_code}, errors {errors}")
+                return False
+            if after != before or reserved_after != reserved_before:
+                self.log_result("Cart Batch Atomicity", False, "Rejected batch changed the cart or its reservations")
+                return False
+            self.log_result("Cart Batch Atomicity", True, "Rejected batch reported every error and changed nothing")
+            return True
+        except Exception as e:
+            self.log_result("Cart Batch Atomicity", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_logout_token_cache(self):
+        """Test that logout ends only its own session, even once the token is cached"""
+        try:
+            server, client = self.in_process_backend()
+            email = f"logout.{uuid.uuid4().hex[:8]}@qualitystore.com"
+            client.post("/api/customer/register", json={
+                "name": "Logout Tester", "email": email, "password": "logout-test-password", "phone": "+1-555-0123"
+            })
+            tokens = [
+                client.post("/api/customer/login", json={"email": email, "password": "logout-test-password"}).json()["token"]
+                for _ in range(2)
+            ]
+            headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+            
+            statuses = [client.get("/api/customer/profile", headers=h).status_code for h in headers]
+            if statuses != [200, 200]:
+                self.log_result("Logout Token Cache", False, f"Profile before logout: {statuses}")
+                return False
+            if server.customer_token_cache.get(tokens[0], time.time()) is None:
+                self.log_result("Logout Token Cache", False, "Verified token was not cached")
+                return False
+            
+            logout = client.post("/api/customer/logout", headers=headers[0])
+            statuses = [client.get("/api/customer/profile", headers=h).status_code for h in headers]
+            if logout.status_code != 200 or statuses != [401, 200]:
+                self.log_result("Logout Token Cache", False, f"Logout {logout.status_code}, profile after logout: {statuses}")
+                return False
+            if server.customer_token_cache.get(tokens[0], time.time()) is not None:
+                self.log_result("Logout Token Cache", False, "Logged-out token is still cached")
+                return False
+            if client.post("/api/customer/logout", headers=headers[0]).status_code != 401:
+                self.log_result("Logout Token Cache", False, "Second logout with the same token was accepted")
+                return False
+            self.log_result("Logout Token Cache", True, "Logout revoked the cached token and kept the other session")
+            return True
+        except Exception as e:
+            self.log_result("Logout Token Cache", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_session_expiry(self):
+        """Test session expiry, the session cap and the on_end notifications"""
+        try:
+            sys.path.insert(0, BACKEND_DIR)
+            from cache import TokenCache
+            from sessions import SessionStore
+            from storage import open_storage
+            
+            ended = []
+            sessions = SessionStore(open_storage(None), "test_sessions", ttl=0.3, max_sessions=2, on_end=ended.append)
+            now = time.time()
+            sessions.create("short", "alice")
+            sessions.create("long", "bob", expires_at=now + 60)
+            if sessions.get("short") is None or len(sessions) != 2:
+                self.log_result("Session Expiry", False, "Fresh sessions are not live")
+                return False
+            time.sleep(0.4)
+            if sessions.get("short") is not None or len(sessions) != 1 or ended != [TokenCache.digest("short")]:
+                self.log_result("Session Expiry", False, f"Expired session was not swept: {len(sessions)} live, ended {ended}")
+                return False
+            
+            # Past the cap, the session closest to expiry is dropped
+            sessions.create("later", "carol", expires_at=now + 120)
+            sessions.create("latest", "dave", expires_at=now + 180)
+            live = [token for token in ("long", "later", "latest") if sessions.get(token) is not None]
+            if live != ["later", "latest"] or ended[-1] != TokenCache.digest("long"):
+                self.log_result("Session Expiry", False, f"Session cap kept {live}, ended {ended}")
+                return False
+            
+            # Revoked sessions do not pile up in the expiry heap
+            for i in range(20):
+                sessions.create(f"revoked-{i}", "erin", expires_at=now + 240)
+                sessions.revoke(f"revoked-{i}")
+            if len(sessions._expiry) > 2 * len(sessions) + 1 or sessions.revoke("revoked-0"):
+                self.log_result("Session Expiry", False, f"Expiry heap holds {len(sessions._expiry)} entries for {len(sessions)} sessions")
+                return False
+            self.log_result("Session Expiry", True, "Sessions expired, were capped and reported every end")
+            return True
+        except Exception as e:
+            self.log_result("Session Expiry", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_rate_limits(self):
+        """Test 429 with Retry-After once a login identity is over its limit"""
+        try:
+            server, client = self.in_process_backend()
+            sys.path.insert(0, BACKEND_DIR)
+            from ratelimit import RateLimiter, SharedBucketStore
+            from storage import open_storage
+            
+            server.rate_limit_store._buckets.clear()
+            try:
+                login = {"email": f"limited.{uuid.uuid4().hex[:8]}@qualitystore.com", "password": "wrong-password"}
+                burst = server.identity_rate_limiter.burst
+                statuses = [client.post("/api/customer/login", json=login).status_code for _ in range(burst)]
+                limited = client.post("/api/customer/login", json=login)
+                other = client.post("/api/customer/login", json={**login, "email": "other." + login["email"]})
+            finally:
+                server.rate_limit_store._buckets.clear()
+            if any(status == 429 for status in statuses) or limited.status_code != 429:
+                self.log_result("Rate Limits", False, f"Statuses within burst {statuses}, past it {limited.status_code}")
+                return False
+            retry_after = int(limited.headers.get("Retry-After", "0"))
+            if not 0 < retry_after <= 1 / server.identity_rate_limiter.rate + 1:
+                self.log_result("Rate Limits", False, f"Retry-After: {limited.headers.get('Retry-After')}")
+                return False
+            if other.status_code == 429:
+                self.log_result("Rate Limits", False, "Another email was throttled with the limited one")
+                return False
+            
+            # Shared buckets are deleted once they have refilled
+            store = SharedBucketStore(open_storage(None))
+            limiter = RateLimiter(rate=10, burst=2, store=store)
+            limiter.acquire("a")
+            limiter.acquire("b")
+            limiter.acquire("b")
+            if store.sweep(time.time() + 0.15) != 1 or store.get("a") is not None or store.get("b") is None:
+                self.log_result("Rate Limits", False, "Sweep did not delete exactly the refilled bucket")
+                return False
+            self.log_result("Rate Limits", True, f"Throttled past the burst with Retry-After {retry_after}s")
+            return True
+        except Exception as e:
+            self.log_result("Rate Limits", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_export_deltas(self):
+        """Test that an export since a version token sends only what changed"""
+        try:
+            server, client = self.in_process_backend()
+            phone_number = next(iter(server.AUTHORIZED_OWNER_PHONES))
+            key = client.post("/api/owner/generate-key", json={"phone_number": phone_number}).json()["security_key"]
+            token = client.post("/api/owner/login", json={"phone_number": phone_number, "security_key": key}).json()["token"]
+            headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"}
+            
+            def export(since=None):
+                params = {"since": since} if since is not None else {}
+                response = client.get("/api/products/export", params=params)
+                records = [json.loads(line) for line in response.text.splitlines()]
+                return response.headers["X-Export-Type"], response.headers["X-Catalog-Version"], records
+            
+            export_type, version, records = export()
+            if export_type != "full" or len(records) != len(server.catalog):
+                self.log_result("Export Deltas", False, f"First export: {export_type} with {len(records)} records")
+                return False
+            unchanged = export(version)
+            
+            body = json.dumps({"name": "Delta Figs", "category": "fruits", "price": 6.5, "stock": 8})
+            client.post("/api/owner/products/import", headers=headers, content=body)
+            added = export(version)
+            product_id = added[2][0]["id"] if added[2] else None
+            client.delete(f"/api/owner/products/{product_id}", headers=headers)
+            removed = export(added[1])
+            foreign = export("another-store.1.1")
+            
+            if unchanged[0] != "delta" or unchanged[2]:
+                self.log_result("Export Deltas", False, f"Unchanged catalog exported as {unchanged[0]} with {len(unchanged[2])} records")
+                return False
+            if added[0] != "delta" or [record["name"] for record in added[2]] != ["Delta Figs"]:
+                self.log_result("Export Deltas", False, f"Delta after import: {added[0]} {added[2]}")
+                return False
+            if removed[0] != "delta" or removed[2] != [{"id": product_id, "deleted": True}]:
+                self.log_result("Export Deltas", False, f"Delta after delete: {removed[0]} {removed[2]}")
+                return False
+            if foreign[0] != "full" or len(foreign[2]) != len(records):
+                self.log_result("Export Deltas", False, f"Foreign token got {foreign[0]} with {len(foreign[2])} records")
+                return False
+            self.log_result("Export Deltas", True, "Deltas carried only the added and removed product")
+            return True
+        except Exception as e:
+            self.log_result("Export Deltas", False, f"Exception: {str(e)}")
+        return False
+    
+    def test_cart_events(self):
+        """Test that the cart event stream pushes stock changes and ends at logout"""
+        try:
+            server, _ = self.in_process_backend()
+            from fastapi.testclient import TestClient
+            
+            session_check = server.CART_EVENTS_SESSION_CHECK
+            server.CART_EVENTS_SESSION_CHECK = 0.2
+            try:
+                # One portal for every request, so the stream and the cart changes share an event loop
+                with TestClient(server.app) as client:
+                    customer_id, headers = self.in_process_customer(client)
+                    _, other_headers = self.in_process_customer(client)
+                    add = {"operations": [{"op": "add", "product_id": "3", "quantity": 1}]}
+                    client.post("/api/customer/cart/batch", headers=headers, json=add)
+                    
+                    streamed = []
+                    reader = threading.Thread(
+                        target=lambda: streamed.append(client.get("/api/customer/cart/events", headers=headers)),
+                        daemon=True
+                    )
+                    reader.start()
+                    time.sleep(0.5)
+                    client.post("/api/customer/cart/batch", headers=other_headers, json=add)
+                    time.sleep(0.5)
+                    client.post("/api/customer/logout", headers=headers)
+                    reader.join(timeout=10)
+                    
+                    client.post("/api/customer/cart/batch", headers=other_headers, json={"operations": [{"op": "remove", "product_id": "3"}]})
+                    server.stock_ledger.release("3", customer_id)
+            finally:
+                server.CART_EVENTS_SESSION_CHECK = session_check
+            
+            if reader.is_alive() or not streamed:
+                self.log_result("Cart Events", False, "Event stream stayed open after logout")
+                return False
+            updates = [
+                json.loads(line[len("data: "):])["products"]
+                for line in streamed[0].text.splitlines() if line.startswith("data: ")
+            ]
+            available = [state["available"] for products in updates for state in products if state["product_id"] == "3"]
+            if len(available) != 2 or available[1] != available[0] - 1:
+                self.log_result("Cart Events", False, f"Availability pushed for the cart product: {available}")
+                return False
+            if customer_id in server.product_events._by_owner:
+                self.log_result("Cart Events", False, "Subscription outlived the stream")
+                return False
+            self.log_result("Cart Events", True, f"Pushed availability {available} and closed at logout")
+            return True
+        except Exception as e:
+            self.log_result("Cart Events", False, f"Exception: {str(e)}")
+        return False
+    
     def run_all_tests(self):
         """Run all backend API tests"""
         print("=" * 80)
@@ -729,6 +1363,20 @@ class QualityStoreAPITester:
             ("Chat System", self.test_chat_system),
             ("Loyalty Program", self.test_loyalty_program),
             ("🔥 NEW: Owner Product Deletion", self.test_owner_product_deletion),
+            ("Stock Reservations", self.test_stock_reservations),
+            ("Concurrent Last Unit Reservation", self.test_concurrent_last_unit_reservation),
+            ("Multi-SKU Lock Order", self.test_multi_sku_lock_order),
+            ("Checkout Stock", self.test_checkout_stock),
+            ("Product Import Report", self.test_product_import_report),
+            ("CSV Import With BOM", self.test_csv_import_with_bom),
+            ("Search Ranking", self.test_search_ranking),
+            ("Product ETags", self.test_product_etags),
+            ("Cart Batch Atomicity", self.test_cart_batch_atomicity),
+            ("Logout Token Cache", self.test_logout_token_cache),
+            ("Session Expiry", self.test_session_expiry),
+            ("Rate Limits", self.test_rate_limits),
+            ("Export Deltas", self.test_export_deltas),
+            ("Cart Events", self.test_cart_events),
             ("Error Handling", self.test_error_handling)
         ]
         
@@ -157,6 +157,43 @@ class QualityStoreBasicTester:
             self.log_result("Products Comprehensive Test", False, f"Exception: {str(e)}")
         return False
     
+    def test_products_pagination(self):
+        """Test cursor pagination and field projection on the products list"""
+        try:
+            response = requests.get(f"{self.base_url}/products", timeout=10)
+            if response.status_code != 200:
+                self.log_result("Products Pagination", False, f"Status code: {response.status_code}")
+                return False
+            all_ids = [p["id"] for p in response.json()["products"]]
+            
+            # Walk the catalog page by page, projecting only name and price
+            paged_ids = []
+            cursor = None
+            while True:
+                params = {"limit": 5, "fields": "name,price"}
+                if cursor:
+                    params["cursor"] = cursor
+                response = requests.get(f"{self.base_url}/products", params=params, timeout=10)
+                if response.status_code != 200:
+                    self.log_result("Products Pagination", False, f"Status code: {response.status_code}")
+                    return False
+                page = response.json()
+                if any(set(p) != {"id", "name", "price"} for p in page["products"]):
+                    self.log_result("Products Field Projection", False, "Unexpected fields in projected products", page)
+                    return False
+                paged_ids.extend(p["id"] for p in page["products"])
+                cursor = page.get("next_cursor")
+                if not cursor:
+                    break
+            
+            if paged_ids == all_ids:
+                self.log_result("Products Pagination", True, f"Paged through {len(paged_ids)} products in pages of 5")
+                return True
+            self.log_result("Products Pagination", False, f"Paged ids {paged_ids} do not match full listing {all_ids}")
+        except Exception as e:
+            self.log_result("Products Pagination", False, f"Exception: {str(e)}")
+        return False
+    
     def test_error_handling(self):
         """Test error handling for invalid requests"""
         try:
@@ -316,6 +353,7 @@ class QualityStoreBasicTester:
             ("Health Check", self.test_health_check),
             ("Categories", self.test_categories),
             ("Products Comprehensive", self.test_products_comprehensive),
+            ("Products Pagination", self.test_products_pagination),
             ("Error Handling", self.test_error_handling),
             ("API Performance", self.test_api_performance),
             ("Database-Dependent Endpoints", self.test_database_dependent_endpoints)
@@ -63,6 +63,97 @@ CREATE TABLE IF NOT EXISTS chat_messages (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Application state tables used by backend/storage.py (DATABASE_URL=postgresql://...)
+-- Each repository stores JSON documents keyed by id; the backend also creates
+-- these on startup if they are missing. Carts and orders use the carts and
+-- orders tables above. Customer accounts do not use the users table: they
+-- carry a password hash, which users has no column for, so they live in
+-- customer_users (users_store holds the /api/users records, whose is_owner
+-- flag has no users column either)
+CREATE TABLE IF NOT EXISTS users_store (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS customer_users (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS customer_emails (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS owner_sessions (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS customer_sessions (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS uploaded_products (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+-- Per-SKU on-hand counts and cart reservations
+CREATE TABLE IF NOT EXISTS stock_ledger (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+-- Product ids changed by owner uploads, imports and deletions, keyed by catalog version
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+-- Store-wide settings such as the epoch of catalog version tokens
+CREATE TABLE IF NOT EXISTS store_metadata (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+-- Recent on-hand levels published by checkouts, keyed by stock version
+CREATE TABLE IF NOT EXISTS stock_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+-- Ids of each customer's orders (the orders themselves are in the orders table)
+CREATE TABLE IF NOT EXISTS customer_order_ids (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+-- Token buckets for login, registration and owner key rate limits
+CREATE TABLE IF NOT EXISTS rate_limits (
+    seq BIGSERIAL PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    data JSONB NOT NULL
+);
+
+-- Id counters for customers, users and owner products
+CREATE TABLE IF NOT EXISTS store_counters (
+    name TEXT PRIMARY KEY,
+    value BIGINT NOT NULL
+);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_carts_user_id ON carts(user_id);
 CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);